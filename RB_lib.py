@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Single-qubit Clifford group and randomized benchmarking sequences.
+
+The 24 Cliffords are built once at import, as 2x2 unitaries (up to a global
+phase) together with their shortest decomposition in the physical pulses of
+:data:`PULSES`. Composition and inversion are then pure table lookups:
+
+- ``MULTIPLICATION_TABLE[a, b]`` is the Clifford "``a`` then ``b``"
+- ``INVERSE[a]`` is the Clifford undoing ``a``
+
+Random sequences are drawn, composed and compiled with NumPy for all
+sequences at once, and compiled sequences are cached on disk keyed by
+``(length, seed)``.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dataset_lib import DATA_DIR
+
+PULSES = ("X90", "Y90", "mX90", "mY90", "X180", "Y180")
+N_CLIFFORDS = 24
+
+
+def _rotation(axis: str, angle: float) -> np.ndarray:
+    pauli = {"X": np.array([[0, 1], [1, 0]], dtype=complex),
+             "Y": np.array([[0, -1j], [1j, 0]], dtype=complex)}[axis]
+    return np.cos(angle / 2) * np.eye(2) - 1j * np.sin(angle / 2) * pauli
+
+
+PULSE_UNITARIES = np.array([_rotation("X", np.pi / 2), _rotation("Y", np.pi / 2),
+                            _rotation("X", -np.pi / 2), _rotation("Y", -np.pi / 2),
+                            _rotation("X", np.pi), _rotation("Y", np.pi)])
+
+
+def _key(unitary: np.ndarray) -> Tuple[float, ...]:
+    """Hashable representation of ``unitary`` up to a global phase."""
+    flat = unitary.ravel()
+    pivot = flat[np.argmax(np.abs(flat) > 1e-6)]
+    flat = flat * abs(pivot) / pivot
+    return tuple(np.round(np.concatenate([flat.real, flat.imag]), 6) + 0.0)
+
+
+def _build_clifford_group() -> Tuple[np.ndarray, List[Tuple[int, ...]]]:
+    """Breadth-first search of the group generated by :data:`PULSES`."""
+    unitaries = [np.eye(2, dtype=complex)]
+    decompositions: List[Tuple[int, ...]] = [()]
+    index = {_key(unitaries[0]): 0}
+    frontier = [0]
+    while frontier:
+        next_frontier = []
+        for element in frontier:
+            for pulse, pulse_unitary in enumerate(PULSE_UNITARIES):
+                unitary = pulse_unitary @ unitaries[element]
+                key = _key(unitary)
+                if key not in index:
+                    index[key] = len(unitaries)
+                    unitaries.append(unitary)
+                    decompositions.append(decompositions[element] + (pulse,))
+                    next_frontier.append(index[key])
+        frontier = next_frontier
+    return np.array(unitaries), decompositions
+
+
+CLIFFORD_UNITARIES, CLIFFORD_PULSES = _build_clifford_group()
+assert len(CLIFFORD_UNITARIES) == N_CLIFFORDS
+
+
+def _build_tables() -> Tuple[np.ndarray, np.ndarray]:
+    index = {_key(unitary): i for i, unitary in enumerate(CLIFFORD_UNITARIES)}
+    table = np.empty((N_CLIFFORDS, N_CLIFFORDS), dtype=np.int8)
+    for a, first in enumerate(CLIFFORD_UNITARIES):
+        for b, second in enumerate(CLIFFORD_UNITARIES):
+            table[a, b] = index[_key(second @ first)]
+    inverse = np.argmax(table == 0, axis=1).astype(np.int8)
+    return table, inverse
+
+
+MULTIPLICATION_TABLE, INVERSE = _build_tables()
+PULSE_COUNT = np.array([len(pulses) for pulses in CLIFFORD_PULSES])
+
+
+def compose(cliffords: np.ndarray) -> np.ndarray:
+    """
+    Net Clifford of each row of ``cliffords`` (applied left to right).
+
+    Neighbouring columns are combined pairwise through the multiplication
+    table, so a batch of sequences of length ``m`` takes ``log2(m)``
+    vectorised lookups.
+    """
+    net = np.asarray(cliffords, dtype=np.int8)
+    if net.shape[-1] == 0:
+        return np.zeros(net.shape[:-1], dtype=np.int8)
+    while net.shape[-1] > 1:
+        if net.shape[-1] % 2:
+            net = np.concatenate([net, np.zeros(net.shape[:-1] + (1,), np.int8)],
+                                 axis=-1)
+        net = MULTIPLICATION_TABLE[net[..., 0::2], net[..., 1::2]]
+    return net[..., 0]
+
+
+def random_sequences(length: int, n_sequences: int, seed: int) -> np.ndarray:
+    """
+    ``n_sequences`` random RB sequences of ``length`` Cliffords.
+
+    Each row ends with the recovery Clifford, so it has ``length + 1``
+    entries and composes to the identity. For a given ``(length, seed)`` the
+    first rows do not depend on ``n_sequences``.
+    """
+    rng = np.random.default_rng(seed)
+    cliffords = rng.integers(0, N_CLIFFORDS, size=(n_sequences, length),
+                             dtype=np.int8)
+    recovery = INVERSE[compose(cliffords)]
+    return np.concatenate([cliffords, recovery[:, None]], axis=1)
+
+
+def compile_sequences(cliffords: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Physical pulses of Clifford sequences.
+
+    Returns:
+        ``(pulses, offsets)``: the indices in :data:`PULSES` of all sequences
+        concatenated, and the ``n_sequences + 1`` offsets of each sequence in
+        ``pulses``.
+    """
+    cliffords = np.asarray(cliffords)
+    counts = PULSE_COUNT[cliffords]
+    offsets = np.zeros(len(cliffords) + 1, dtype=np.int64)
+    np.cumsum(counts.sum(axis=1), out=offsets[1:])
+    padded = np.full((N_CLIFFORDS, PULSE_COUNT.max()), -1, dtype=np.int8)
+    for i, pulses in enumerate(CLIFFORD_PULSES):
+        padded[i, :len(pulses)] = pulses
+    flat = padded[cliffords.ravel()].ravel()
+    return flat[flat >= 0], offsets
+
+
+def load_sequences(length: int,
+                   n_sequences: int,
+                   seed: int,
+                   cache_dir: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Compiled RB sequences, from the disk cache when possible.
+
+    The cache holds one file per ``(length, seed)``; it is reused when it
+    contains at least ``n_sequences`` sequences and rewritten otherwise.
+
+    Returns:
+        ``cliffords``, ``pulses`` and ``offsets`` as in
+        :func:`random_sequences` and :func:`compile_sequences`.
+    """
+    cache_dir = cache_dir or os.path.join(DATA_DIR, "rb_cache")
+    path = os.path.join(cache_dir, f"rb_{length}_{seed}.npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if len(cached["cliffords"]) >= n_sequences:
+                offsets = cached["offsets"][:n_sequences + 1]
+                return {"cliffords": cached["cliffords"][:n_sequences],
+                        "pulses": cached["pulses"][:offsets[-1]],
+                        "offsets": offsets}
+    cliffords = random_sequences(length, n_sequences, seed)
+    pulses, offsets = compile_sequences(cliffords)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path, cliffords=cliffords, pulses=pulses, offsets=offsets)
+    return {"cliffords": cliffords, "pulses": pulses, "offsets": offsets}
+
+
+def sequence_pulses(sequences: Dict[str, np.ndarray], i: int) -> List[str]:
+    """Names of the pulses of sequence ``i`` of :func:`load_sequences`."""
+    offsets = sequences["offsets"]
+    return [PULSES[p] for p in sequences["pulses"][offsets[i]:offsets[i + 1]]]
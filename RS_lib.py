@@ -5,12 +5,16 @@ Created on Tue Jul 18 14:03:48 2023
 @author: cold
 """
 
-from typing import Any
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
 
 import qcodes.validators as vals
 from qcodes.instrument import VisaInstrument
 from qcodes.parameters import create_on_off_val_mapping
 
+from event_lib import EventBus, observe
+
 
 class RohdeSchwarzSGS100A(VisaInstrument):
     """
@@ -35,6 +39,13 @@ class RohdeSchwarzSGS100A(VisaInstrument):
 
     This driver does not contain all commands available for the RS_SGS100A but
     only the ones most commonly used.
+
+    Every get and set of a parameter is published on ``self.events``, an
+    :class:`event_lib.EventBus` coalescing the events of each parameter
+    within ``self.events.window`` seconds::
+
+        source.events.subscribe(lambda event: print(event.value),
+                                parameter='frequency')
     """
 
     def __init__(self, name: str, address: str, **kwargs: Any) -> None:
@@ -2585,6 +2596,9 @@ class RohdeSchwarzSGS100A(VisaInstrument):
         self.add_function('reset', call_cmd='*RST')
         self.add_function('run_self_tests', call_cmd='*TST?')
 
+        # change events of every get/set, see event_lib
+        self.events = observe(self, EventBus())
+
         self.connect_message()
 
 
@@ -2597,6 +2611,83 @@ class RohdeSchwarzSGS100A(VisaInstrument):
     def off(self) -> None:
         self.status('off')
 
+    def sweep_commands(self, parameter: str,
+                       values: Sequence[float]) -> List[str]:
+        """
+        SCPI commands stepping ``parameter`` (``'frequency'`` or ``'power'``)
+        through ``values``, one point per external trigger.
+
+        Evenly spaced values use the RF sweep (start, stop and number of
+        points); other values are loaded as a list, at the current level for
+        a frequency list and at the current frequency for a level list (see
+        :meth:`sweep_carries`).
+        """
+        values = np.asarray(values, dtype=float)
+        if parameter not in ('frequency', 'power'):
+            raise ValueError(f"{self.name} cannot sweep {parameter!r}")
+        for value in values[[0, -1]]:
+            self.parameters[parameter].validate(float(value))
+        if self.sweep_carries(parameter, values) is None:
+            if parameter == 'frequency':
+                return ['SOUR:SWE:FREQ:SPAC LIN',
+                        f'SOUR:FREQ:STAR {values[0]:.2f}',
+                        f'SOUR:FREQ:STOP {values[-1]:.2f}',
+                        f'SOUR:SWE:FREQ:POIN {len(values)}',
+                        'SOUR:SWE:FREQ:MODE STEP',
+                        'TRIG:FSW:SOUR EXT',
+                        'SOUR:FREQ:MODE SWE',
+                        'SOUR:SWE:RES:ALL']
+            return [f'SOUR:POW:STAR {values[0]:.2f}',
+                    f'SOUR:POW:STOP {values[-1]:.2f}',
+                    f'SOUR:SWE:POW:POIN {len(values)}',
+                    'SOUR:SWE:POW:MODE STEP',
+                    'TRIG:PSW:SOUR EXT',
+                    'SOUR:POW:MODE SWE',
+                    'SOUR:SWE:RES:ALL']
+        if parameter == 'frequency':
+            freqs, powers = values, np.full(len(values), self.power())
+        else:
+            freqs, powers = np.full(len(values), self.frequency()), values
+        return ["SOUR:LIST:SEL 'coldlab_sweep'",
+                'SOUR:LIST:FREQ ' + ','.join(f'{f:.2f}' for f in freqs),
+                'SOUR:LIST:POW ' + ','.join(f'{p:.2f}' for p in powers),
+                'SOUR:LIST:MODE STEP',
+                'SOUR:LIST:TRIG:SOUR EXT',
+                'SOUR:LIST:LEAR',
+                'SOUR:FREQ:MODE LIST',
+                'SOUR:LIST:RES']
+
+    def sweep_carries(self, parameter: str,
+                      values: Sequence[float]) -> Optional[str]:
+        """
+        The other parameter whose current value is loaded with the sweep of
+        ``parameter`` through ``values``: ``'power'`` for a frequency list,
+        ``'frequency'`` for a level list, None for an RF sweep, which keeps
+        following the fixed frequency or level. The sweep must be loaded
+        again when that parameter changes.
+        """
+        steps = np.diff(np.asarray(values, dtype=float))
+        if len(steps) and np.allclose(steps, steps[0]):
+            return None
+        return 'power' if parameter == 'frequency' else 'frequency'
+
+    def start_sweep(self, parameter: str, values: Sequence[float]) -> None:
+        """
+        Load and arm the sweep of :meth:`sweep_commands`: the output is at
+        the first of ``values`` and moves on by one point per trigger.
+        """
+        self.ask(';'.join(':' + command
+                          for command in self.sweep_commands(parameter, values))
+                 + ';*OPC?')
+
+    def restart_sweep(self) -> None:
+        """Go back to the first point of the armed sweep."""
+        self.ask(':SOUR:SWE:RES:ALL;:SOUR:LIST:RES;*OPC?')
+
+    def stop_sweep(self) -> None:
+        """Back to a fixed frequency and level."""
+        self.ask(':SOUR:FREQ:MODE CW;:SOUR:POW:MODE CW;*OPC?')
+
 
 class RohdeSchwarz_SGS100A(RohdeSchwarzSGS100A):
     pass
\ No newline at end of file
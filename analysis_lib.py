@@ -0,0 +1,612 @@
+# -*- coding: utf-8 -*-
+"""
+Fit and analysis functions shared by the ColdLab measurement routines.
+
+All functions work on plain NumPy arrays and do not touch any instrument, so
+they can be reused offline on saved datasets.
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+from scipy import stats
+from scipy.optimize import curve_fit
+from scipy.signal import hilbert
+from scipy.special import erf
+
+
+def lorentzian(f: np.ndarray, f0: float, fwhm: float, amplitude: float,
+               offset: float) -> np.ndarray:
+    return offset + amplitude / (1 + (2 * (f - f0) / fwhm) ** 2)
+
+
+def find_resonance(freqs: np.ndarray, s21: np.ndarray) -> Tuple[float, float]:
+    """
+    Locate a resonance (dip or peak) in a frequency sweep.
+
+    The largest deviation of ``|s21|`` from the median baseline seeds a
+    Lorentzian fit. If the fit does not converge, or lands outside the swept
+    range, the position of the largest deviation is returned instead.
+
+    Returns:
+        ``(f0, fwhm)`` in the units of ``freqs``.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    mag = np.abs(np.asarray(s21))
+    baseline = np.median(mag)
+    deviation = mag - baseline
+    idx = int(np.argmax(np.abs(deviation)))
+    step = abs(freqs[-1] - freqs[0]) / max(len(freqs) - 1, 1)
+    half = np.abs(deviation) >= np.abs(deviation[idx]) / 2
+    fwhm_guess = max(np.count_nonzero(half), 2) * step
+    guess = (freqs[idx], fwhm_guess, deviation[idx], baseline)
+    try:
+        popt, _ = curve_fit(lorentzian, freqs, mag, p0=guess, maxfev=200)
+    except (RuntimeError, ValueError):
+        return float(freqs[idx]), float(fwhm_guess)
+    f0, fwhm = popt[0], abs(popt[1])
+    if not freqs.min() <= f0 <= freqs.max() or not np.isfinite(fwhm):
+        return float(freqs[idx]), float(fwhm_guess)
+    return float(f0), float(fwhm)
+
+
+def fit_dispersive_shift(freqs: np.ndarray, ground: np.ndarray,
+                         excited: np.ndarray) -> Dict[str, float]:
+    """
+    Joint fit of the resonator traces with the qubit in ``ground`` and
+    ``excited`` state.
+
+    Both ``|s21|`` traces are fitted at once by Lorentzians sharing linewidth,
+    depth and baseline, centred on ``f_mid -/+ chi``; each centre is seeded by
+    :func:`find_resonance` on its own trace.
+
+    Returns:
+        ``chi`` (half the frequency difference excited - ground) and its
+        standard error ``chi_err``, ``f_ground``, ``f_excited`` and ``fwhm``.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    mag = np.abs(np.stack([ground, excited]))
+    (f_g, fwhm_g), (f_e, fwhm_e) = find_resonance(freqs, mag[0]), \
+        find_resonance(freqs, mag[1])
+    baseline = np.median(mag)
+    depth = mag[0][np.argmin(np.abs(freqs - f_g))] - baseline
+
+    def model(f, f_mid, chi, fwhm, amplitude, offset):
+        return np.concatenate([lorentzian(f, f_mid - chi, fwhm, amplitude, offset),
+                               lorentzian(f, f_mid + chi, fwhm, amplitude, offset)])
+
+    guess = ((f_g + f_e) / 2, (f_e - f_g) / 2, (fwhm_g + fwhm_e) / 2, depth,
+             baseline)
+    popt, pcov = curve_fit(lambda f, *p: model(f, *p), freqs, mag.ravel(),
+                           p0=guess, maxfev=1000)
+    f_mid, chi, fwhm = popt[:3]
+    return {"chi": float(chi), "chi_err": float(np.sqrt(pcov[1, 1])),
+            "f_ground": float(f_mid - chi), "f_excited": float(f_mid + chi),
+            "fwhm": float(abs(fwhm))}
+
+
+def peak_snr(data: np.ndarray) -> float:
+    """
+    Signal-to-noise ratio of the largest feature in a trace.
+
+    The largest deviation of ``|data|`` from its median, in units of the
+    noise estimated from the median absolute deviation.
+    """
+    mag = np.abs(np.asarray(data))
+    deviation = np.abs(mag - np.median(mag))
+    noise = 1.4826 * np.median(deviation)
+    return float(deviation.max() / noise) if noise > 0 else np.inf
+
+
+def project_iq(data: np.ndarray) -> np.ndarray:
+    """
+    Project complex IQ traces on their principal axis.
+
+    Works on the last axis of ``data``, for any number of leading (batch)
+    dimensions; the sign of the projected traces is arbitrary.
+    """
+    data = np.asarray(data)
+    centred = data - data.mean(axis=-1, keepdims=True)
+    iq = np.stack([centred.real, centred.imag], axis=-1)
+    _, vectors = np.linalg.eigh(np.swapaxes(iq, -1, -2) @ iq)
+    return (iq @ vectors[..., -1:])[..., 0]
+
+
+def batch_least_squares(model: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                        jacobian: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                        x: np.ndarray,
+                        y: np.ndarray,
+                        p0: np.ndarray,
+                        n_iter: int = 50,
+                        tol: float = 1e-10) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Levenberg-Marquardt fit of one model to a batch of traces at once.
+
+    Every step is computed for all traces together with batched linear
+    algebra, each trace keeping its own damping factor.
+
+    Args:
+        model: ``model(x, p)`` returns the ``(T, N)`` model for ``(T, K)``
+            parameters.
+        jacobian: ``jacobian(x, p)`` returns the ``(T, N, K)`` derivatives.
+        x: ``(N,)`` or ``(T, N)`` abscissa.
+        y: ``(T, N)`` traces.
+        p0: ``(T, K)`` starting values.
+
+    Returns:
+        ``(p, cov)``: the ``(T, K)`` fitted parameters and their ``(T, K, K)``
+        covariance matrices.
+    """
+    p = np.array(p0, dtype=float)
+    n_params = p.shape[1]
+    eye = np.eye(n_params)
+    damping = np.full(len(p), 1e-3)
+    residual = y - model(x, p)
+    cost = np.einsum("tn,tn->t", residual, residual)
+    for _ in range(n_iter):
+        jac = jacobian(x, p)
+        jtj = np.swapaxes(jac, 1, 2) @ jac
+        grad = np.einsum("tnk,tn->tk", jac, residual)
+        scale = np.maximum(np.diagonal(jtj, axis1=1, axis2=2), 1e-30)
+        step = np.linalg.solve(jtj + damping[:, None, None] * eye * scale[:, None, :],
+                               grad[..., None])[..., 0]
+        trial = p + step
+        trial_residual = y - model(x, trial)
+        trial_cost = np.einsum("tn,tn->t", trial_residual, trial_residual)
+        better = trial_cost < cost
+        improvement = np.where(better, cost - trial_cost, 0)
+        p[better] = trial[better]
+        residual[better] = trial_residual[better]
+        cost[better] = trial_cost[better]
+        damping = np.where(better, damping / 3, damping * 4)
+        if np.all(improvement <= tol * np.maximum(cost, 1e-30)) and np.all(damping < 1):
+            break
+    jac = jacobian(x, p)
+    jtj = np.swapaxes(jac, 1, 2) @ jac
+    dof = max(y.shape[-1] - n_params, 1)
+    norm = 1 / np.sqrt(np.maximum(np.diagonal(jtj, axis1=1, axis2=2), 1e-300))
+    cov = norm[:, :, None] * np.linalg.pinv(norm[:, :, None] * jtj * norm[:, None, :]) \
+        * norm[:, None, :] * (cost / dof)[:, None, None]
+    return p, cov
+
+
+def dominant_frequency(x: np.ndarray, y: np.ndarray,
+                       oversampling: int = 4) -> np.ndarray:
+    """
+    Frequency of the strongest oscillation of each trace in ``y``.
+
+    The periodogram is evaluated on a grid from half a period over the span
+    of ``x`` up to the Nyquist frequency of its mean step, for all traces
+    with one matrix product (``x`` does not need to be uniform).
+    """
+    x = np.asarray(x, dtype=float)
+    span = x.max() - x.min()
+    freqs = np.linspace(0.5 / span, 0.5 * (len(x) - 1) / span,
+                        oversampling * len(x))
+    centred = y - y.mean(axis=-1, keepdims=True)
+    spectrum = np.abs(centred @ np.exp(-2j * np.pi * np.outer(x, freqs))) ** 2
+    return freqs[np.argmax(spectrum, axis=-1)]
+
+
+def _cosine(x: np.ndarray, p: np.ndarray) -> np.ndarray:
+    phase = 2 * np.pi * p[:, 3:4] * x
+    return p[:, 0:1] * np.cos(phase) + p[:, 1:2] * np.sin(phase) + p[:, 2:3]
+
+
+def _cosine_jacobian(x: np.ndarray, p: np.ndarray) -> np.ndarray:
+    x = np.broadcast_to(x, (len(p), np.shape(x)[-1]))
+    phase = 2 * np.pi * p[:, 3:4] * x
+    cos, sin = np.cos(phase), np.sin(phase)
+    dfreq = 2 * np.pi * x * (p[:, 1:2] * cos - p[:, 0:1] * sin)
+    return np.stack([cos, sin, np.ones_like(x), dfreq], axis=-1)
+
+
+def fit_rabi(x: np.ndarray, traces: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Fit ``offset + amplitude * cos(2 pi frequency x + phase)`` to Rabi traces.
+
+    ``traces`` can have any number of leading dimensions (qubits,
+    repetitions...) over a shared last axis ``x``; complex traces are first
+    projected with :func:`project_iq`. All traces are fitted together: the
+    frequency is seeded by :func:`dominant_frequency`, the quadratures and
+    offset by a batched linear least-squares, then refined with
+    :func:`batch_least_squares`.
+
+    Returns:
+        Arrays with the leading shape of ``traces`` for ``frequency``,
+        ``amplitude``, ``phase``, ``offset``, ``x_pi`` (the first extremum
+        opposite to the value at ``x = 0``) and ``frequency_err``.
+    """
+    x = np.asarray(x, dtype=float)
+    traces = np.asarray(traces)
+    if np.iscomplexobj(traces):
+        traces = project_iq(traces)
+    shape = traces.shape[:-1]
+    y = traces.reshape(-1, len(x)).astype(float)
+
+    freq = dominant_frequency(x, y)
+    phase = 2 * np.pi * freq[:, None] * x
+    design = np.stack([np.cos(phase), np.sin(phase), np.ones_like(phase)], axis=-1)
+    lhs = np.swapaxes(design, 1, 2) @ design
+    rhs = np.einsum("tnk,tn->tk", design, y)
+    linear = np.linalg.solve(lhs, rhs[..., None])[..., 0]
+    p, cov = batch_least_squares(_cosine, _cosine_jacobian, x, y,
+                                 np.column_stack([linear, freq]))
+
+    freq = np.abs(p[:, 3])
+    amplitude = np.hypot(p[:, 0], p[:, 1])
+    phi = np.arctan2(-p[:, 1] * np.sign(p[:, 3]), p[:, 0])
+    target = (np.round(phi / np.pi) + 1) * np.pi
+    x_pi = (target - phi) / (2 * np.pi * freq)
+    result = {"frequency": freq, "amplitude": amplitude, "phase": phi,
+              "offset": p[:, 2], "x_pi": x_pi,
+              "frequency_err": np.sqrt(np.abs(cov[:, 3, 3]))}
+    return {key: value.reshape(shape) for key, value in result.items()}
+
+
+def _decay(t: np.ndarray, p: np.ndarray) -> np.ndarray:
+    return p[:, 0:1] * np.exp(-t / p[:, 1:2]) + p[:, 2:3]
+
+
+def _decay_jacobian(t: np.ndarray, p: np.ndarray) -> np.ndarray:
+    t = np.broadcast_to(t, (len(p), np.shape(t)[-1]))
+    decay = np.exp(-t / p[:, 1:2])
+    dtau = p[:, 0:1] * decay * t / p[:, 1:2] ** 2
+    return np.stack([decay, dtau, np.ones_like(t)], axis=-1)
+
+
+def fit_exponential(t: np.ndarray, traces: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Fit ``offset + amplitude * exp(-t / tau)`` to decay traces (T1, T2 echo).
+
+    Works like :func:`fit_rabi`: any leading dimensions, complex traces
+    projected with :func:`project_iq`, all traces fitted together. The
+    offset is seeded from the longest delay, ``tau`` from the first delay
+    where the signal has decayed by ``1/e``.
+
+    Returns:
+        Arrays with the leading shape of ``traces`` for ``tau``, ``tau_err``,
+        ``amplitude`` and ``offset``.
+    """
+    t = np.asarray(t, dtype=float)
+    traces = np.asarray(traces)
+    if np.iscomplexobj(traces):
+        traces = project_iq(traces)
+    shape = traces.shape[:-1]
+    y = traces.reshape(-1, len(t)).astype(float)
+
+    order = np.argsort(t)
+    offset = y[:, order[-1]]
+    amplitude = y[:, order[0]] - offset
+    with np.errstate(divide="ignore", invalid="ignore"):
+        decayed = (y[:, order] - offset[:, None]) / amplitude[:, None] < np.exp(-1)
+    tau = np.where(decayed.any(axis=-1), t[order][np.argmax(decayed, axis=-1)],
+                   t.max())
+    tau = np.maximum(tau, t[order][1] if len(t) > 1 else tau)
+    p, cov = batch_least_squares(_decay, _decay_jacobian, t, y,
+                                 np.column_stack([amplitude, tau, offset]))
+    result = {"tau": np.abs(p[:, 1]), "tau_err": np.sqrt(np.abs(cov[:, 1, 1])),
+              "amplitude": p[:, 0], "offset": p[:, 2]}
+    return {key: value.reshape(shape) for key, value in result.items()}
+
+
+def fft_frequency(t: np.ndarray, y: np.ndarray, padding: int = 4) -> np.ndarray:
+    """
+    Oscillation frequency of each trace of ``y`` on the uniform grid ``t``.
+
+    Zero-padded real FFT of the mean-subtracted traces, with a parabolic
+    interpolation of the peak; the DC bin is never selected.
+    """
+    t = np.asarray(t, dtype=float)
+    n = len(t) * padding
+    spectrum = np.abs(np.fft.rfft(y - y.mean(axis=-1, keepdims=True), n=n, axis=-1))
+    spectrum[..., 0] = 0
+    peak = np.clip(np.argmax(spectrum, axis=-1), 1, spectrum.shape[-1] - 2)
+    rows = np.arange(len(peak))
+    left, centre, right = (spectrum[rows, peak - 1], spectrum[rows, peak],
+                           spectrum[rows, peak + 1])
+    denominator = left - 2 * centre + right
+    shift = np.where(denominator != 0,
+                     0.5 * (left - right) / np.where(denominator != 0, denominator, 1), 0)
+    return (peak + shift) / (n * (t[1] - t[0]))
+
+
+def _damped_cosine(t: np.ndarray, p: np.ndarray) -> np.ndarray:
+    phase = 2 * np.pi * p[:, 3:4] * t
+    envelope = np.exp(-t / p[:, 4:5])
+    return envelope * (p[:, 0:1] * np.cos(phase) + p[:, 1:2] * np.sin(phase)) + p[:, 2:3]
+
+
+def _damped_cosine_jacobian(t: np.ndarray, p: np.ndarray) -> np.ndarray:
+    t = np.broadcast_to(t, (len(p), np.shape(t)[-1]))
+    phase = 2 * np.pi * p[:, 3:4] * t
+    envelope = np.exp(-t / p[:, 4:5])
+    cos, sin = envelope * np.cos(phase), envelope * np.sin(phase)
+    oscillation = p[:, 0:1] * cos + p[:, 1:2] * sin
+    dfreq = 2 * np.pi * t * (p[:, 1:2] * cos - p[:, 0:1] * sin)
+    dtau = oscillation * t / p[:, 4:5] ** 2
+    return np.stack([cos, sin, np.ones_like(t), dfreq, dtau], axis=-1)
+
+
+def fit_ramsey(t: np.ndarray, traces: np.ndarray,
+               n_iter: int = 20) -> Dict[str, np.ndarray]:
+    """
+    Fit ``offset + exp(-t / t2) * amplitude * cos(2 pi frequency t + phase)``.
+
+    ``t`` must be uniformly spaced. The starting values come from the traces
+    themselves so that the nonlinear fit only needs a few iterations: the
+    frequency from :func:`fft_frequency`, the decay time from a straight-line
+    fit of the logarithm of the Hilbert envelope, the quadratures and offset
+    from a batched linear least-squares. Any number of leading dimensions
+    (repetitions for drift tracking, qubits...) is fitted in one call.
+
+    Returns:
+        Arrays with the leading shape of ``traces`` for ``frequency``,
+        ``frequency_err``, ``t2``, ``t2_err``, ``amplitude``, ``phase`` and
+        ``offset``.
+    """
+    t = np.asarray(t, dtype=float)
+    traces = np.asarray(traces)
+    if np.iscomplexobj(traces):
+        traces = project_iq(traces)
+    shape = traces.shape[:-1]
+    y = traces.reshape(-1, len(t)).astype(float)
+    centred = y - y.mean(axis=-1, keepdims=True)
+
+    freq = fft_frequency(t, y)
+    log_envelope = np.log(np.maximum(np.abs(hilbert(centred, axis=-1)), 1e-12))
+    design = np.column_stack([t, np.ones_like(t)])
+    slope = np.linalg.lstsq(design, log_envelope.T, rcond=None)[0][0]
+    span = t[-1] - t[0]
+    tau = np.where(slope < 0, -1 / np.minimum(slope, -1e-300), 10 * span)
+    tau = np.clip(tau, span / len(t), 10 * span)
+
+    envelope = np.exp(-t / tau[:, None])
+    phase = 2 * np.pi * freq[:, None] * t
+    basis = np.stack([envelope * np.cos(phase), envelope * np.sin(phase),
+                      np.ones_like(phase)], axis=-1)
+    linear = np.linalg.solve(np.swapaxes(basis, 1, 2) @ basis,
+                             np.einsum("tnk,tn->tk", basis, y)[..., None])[..., 0]
+    p, cov = batch_least_squares(_damped_cosine, _damped_cosine_jacobian, t, y,
+                                 np.column_stack([linear, freq, tau]),
+                                 n_iter=n_iter)
+    result = {"frequency": np.abs(p[:, 3]),
+              "frequency_err": np.sqrt(np.abs(cov[:, 3, 3])),
+              "t2": np.abs(p[:, 4]), "t2_err": np.sqrt(np.abs(cov[:, 4, 4])),
+              "amplitude": np.hypot(p[:, 0], p[:, 1]),
+              "phase": np.arctan2(-p[:, 1] * np.sign(p[:, 3]), p[:, 0]),
+              "offset": p[:, 2]}
+    return {key: value.reshape(shape) for key, value in result.items()}
+
+
+def signal_onset(trace: np.ndarray, n_baseline: int = 64,
+                 threshold: float = 5.0,
+                 template: Optional[np.ndarray] = None,
+                 window: int = 16) -> int:
+    """
+    Index of the first sample of the readout pulse in an averaged trace.
+
+    Without ``template``, the envelope is the trailing mean square of the
+    trace over ``window`` samples, so it only rises once the pulse has
+    started. The onset is the first sample where it exceeds the noise
+    variance of the first ``n_baseline`` samples by more than noise alone
+    would with the probability of a ``threshold`` sigma Gaussian event (their
+    ratio is F-distributed, which accounts for the short baseline). With a
+    ``template`` of the pulse, it is the lag maximising the magnitude of the
+    correlation of the trace with the analytic template. Returns -1 if no
+    pulse is found.
+    """
+    trace = np.asarray(trace, dtype=float)
+    trace = trace - trace[:n_baseline].mean()
+    if template is not None:
+        reference = hilbert(np.asarray(template, dtype=float))
+        correlation = np.correlate(trace, reference, mode="valid")
+        return int(np.argmax(np.abs(correlation)))
+    noise = trace[:n_baseline].var()
+    mean_square = np.convolve(trace ** 2, np.full(window, 1 / window))[:len(trace)]
+    ratio = stats.f.isf(stats.norm.sf(threshold), window, n_baseline - 1)
+    above = mean_square > ratio * noise
+    above[:n_baseline] = False
+    return int(np.argmax(above)) if above.any() else -1
+
+
+def population(data: np.ndarray, ground: complex, excited: complex) -> np.ndarray:
+    """Excited population of IQ points, by projection on the ground-excited axis."""
+    axis = excited - ground
+    return ((np.asarray(data) - ground) * np.conj(axis)).real / abs(axis) ** 2
+
+
+def fit_flipping(n: np.ndarray, pop: np.ndarray) -> Tuple[float, float]:
+    """
+    Relative amplitude error of a π pulse from a flipping experiment.
+
+    ``pop`` is the excited population after a π/2 pulse followed by ``n``
+    (even) π pulses, ``0.5 + 0.5 sin(pi eps (n + 1/2))`` for a rotation angle
+    ``pi (1 + eps)``. The linear small-error solution seeds the fit.
+
+    Returns:
+        ``(eps, eps_err)``.
+    """
+    x = np.pi * (np.asarray(n, dtype=float) + 0.5)
+    y = np.asarray(pop, dtype=float) - 0.5
+    seed = np.dot(y, x) / (0.5 * np.dot(x, x))
+    popt, pcov = curve_fit(lambda x, eps: 0.5 * np.sin(eps * x), x, y, p0=[seed])
+    return float(popt[0]), float(np.sqrt(pcov[0, 0]))
+
+
+class ShotClassifier:
+    """
+    Linear discriminant (LDA) for single-shot IQ readout, trained on streams.
+
+    Training only accumulates per-state counts, sums and scatter matrices of
+    the shots, so :meth:`partial_fit` can be fed batch after batch without
+    keeping them; the discriminant is recomputed from those statistics when
+    needed. Classification is one affine map of the I and Q arrays.
+
+    Args:
+        n_states: number of prepared states (2 for ground/excited).
+    """
+
+    def __init__(self, n_states: int = 2) -> None:
+        self.n_states = n_states
+        self.counts = np.zeros(n_states)
+        self.sums = np.zeros((n_states, 2))
+        self.scatter = np.zeros((n_states, 2, 2))
+        self._weights = None
+
+    def partial_fit(self, shots: np.ndarray, labels: Union[int, np.ndarray]) -> None:
+        """Add a batch of complex ``shots`` prepared in ``labels`` (int or array)."""
+        shots = np.asarray(shots).ravel()
+        iq = np.column_stack([shots.real, shots.imag]).astype(float)
+        labels = np.broadcast_to(labels, shots.shape)
+        for state in range(self.n_states):
+            selected = iq[labels == state]
+            self.counts[state] += len(selected)
+            self.sums[state] += selected.sum(axis=0)
+            self.scatter[state] += selected.T @ selected
+        self._weights = None
+
+    @property
+    def means(self) -> np.ndarray:
+        """Mean IQ point of each state, as complex numbers."""
+        means = self.sums / np.maximum(self.counts, 1)[:, None]
+        return means[:, 0] + 1j * means[:, 1]
+
+    def _discriminant(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._weights is None:
+            if np.any(self.counts == 0):
+                raise RuntimeError("Every state needs training shots")
+            means = self.sums / self.counts[:, None]
+            within = (self.scatter - self.counts[:, None, None]
+                      * means[:, :, None] * means[:, None, :]).sum(axis=0)
+            covariance = within / max(self.counts.sum() - self.n_states, 1)
+            weights = np.linalg.solve(covariance, means.T)
+            offsets = -0.5 * np.einsum("kd,dk->k", means, weights)
+            self._weights = (weights, offsets)
+        return self._weights
+
+    def decision(self, shots: np.ndarray,
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Discriminant scores of the ``shots``: the difference of the state 1
+        and state 0 scores for two states, the ``(N, n_states)`` scores
+        otherwise. Given ``out`` (float64, C-contiguous), the scores are
+        written there without temporaries.
+        """
+        shots = np.asarray(shots)
+        weights, offsets = self._discriminant()
+        if out is not None:
+            if self.n_states == 2:
+                weights = weights[:, 1] - weights[:, 0]
+                offsets = offsets[1] - offsets[0]
+            pairs = np.ascontiguousarray(shots, dtype=complex).view(float)
+            np.dot(pairs.reshape(shots.shape + (2,)), weights, out=out)
+            out += offsets
+            return out
+        if self.n_states == 2:
+            w = weights[:, 1] - weights[:, 0]
+            return shots.real * w[0] + shots.imag * w[1] + (offsets[1] - offsets[0])
+        return (shots.real[..., None] * weights[0] + shots.imag[..., None] * weights[1]
+                + offsets)
+
+    def predict(self, shots: np.ndarray) -> np.ndarray:
+        """Assigned state of each shot."""
+        scores = self.decision(shots)
+        if self.n_states == 2:
+            return (scores > 0).astype(np.int8)
+        return np.argmax(scores, axis=-1).astype(np.int8)
+
+    def assignment_matrix(self, shots: np.ndarray,
+                          labels: Union[int, np.ndarray]) -> np.ndarray:
+        """
+        ``P(assigned j | prepared i)`` in one classification pass over the
+        shots, counted with a single ``bincount``.
+        """
+        shots = np.asarray(shots).ravel()
+        labels = np.broadcast_to(labels, shots.shape)
+        counts = np.bincount(labels * self.n_states + self.predict(shots),
+                             minlength=self.n_states ** 2)
+        counts = counts.reshape(self.n_states, self.n_states).astype(float)
+        return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Training statistics, JSON serializable."""
+        return {"n_states": self.n_states, "counts": self.counts.tolist(),
+                "sums": self.sums.tolist(), "scatter": self.scatter.tolist()}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "ShotClassifier":
+        classifier = cls(state["n_states"])
+        classifier.counts = np.array(state["counts"], dtype=float)
+        classifier.sums = np.array(state["sums"], dtype=float)
+        classifier.scatter = np.array(state["scatter"], dtype=float)
+        return classifier
+
+
+def assignment_fidelity(matrix: np.ndarray) -> float:
+    """Average assignment fidelity, the mean of the diagonal."""
+    return float(np.mean(np.diag(matrix)))
+
+
+def joint_counts(first: np.ndarray, second: np.ndarray, n_states: int = 2,
+                 counts: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Contingency table of two readout outcomes of the same shots.
+
+    ``counts[i, j]`` is the number of shots assigned ``i`` by the first
+    readout and ``j`` by the second, counted with one ``bincount``. If
+    ``counts`` is given, the batch is added to it in place, so the table of
+    a stream of batches costs no more than the batches themselves.
+    """
+    table = np.bincount((first * n_states + second).ravel(),
+                        minlength=n_states ** 2).reshape(n_states, n_states)
+    if counts is None:
+        return table
+    counts += table
+    return counts
+
+
+def qnd_fidelity(counts: np.ndarray) -> float:
+    """
+    QND fidelity of repeated readouts from their :func:`joint_counts`: the
+    mean over the first outcome ``i`` of ``P(second = i | first = i)``.
+    """
+    counts = np.asarray(counts, dtype=float)
+    conditional = counts / np.maximum(counts.sum(axis=-1, keepdims=True), 1)
+    return float(np.mean(np.diag(conditional)))
+
+
+def expected_improvement(x: np.ndarray, y: np.ndarray, candidates: np.ndarray,
+                         length_scale: float = 0.2,
+                         noise: float = 1e-2) -> np.ndarray:
+    """
+    Expected improvement over ``max(y)`` of a Gaussian-process model.
+
+    The GP has a squared-exponential kernel of ``length_scale`` on inputs
+    normalised to the unit cube, and a ``noise`` variance relative to the
+    variance of ``y``.
+
+    Args:
+        x: ``(n, d)`` evaluated points, normalised to ``[0, 1]``.
+        y: ``(n,)`` values at those points (to be maximised).
+        candidates: ``(m, d)`` normalised points to score.
+    """
+    x, candidates = np.atleast_2d(x), np.atleast_2d(candidates)
+    mean, std = y.mean(), y.std() or 1.0
+    target = (y - mean) / std
+
+    def kernel(a, b):
+        distance = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1)
+        return np.exp(-0.5 * distance / length_scale ** 2)
+
+    gram = kernel(x, x) + noise * np.eye(len(x))
+    cross = kernel(candidates, x)
+    factor = np.linalg.cholesky(gram)
+    alpha = np.linalg.solve(factor.T, np.linalg.solve(factor, target))
+    mu = cross @ alpha
+    projected = np.linalg.solve(factor, cross.T)
+    sigma = np.sqrt(np.maximum(1 - (projected ** 2).sum(axis=0), 1e-12))
+    z = (mu - target.max()) / sigma
+    cdf = 0.5 * (1 + erf(z / np.sqrt(2)))
+    pdf = np.exp(-0.5 * z ** 2) / np.sqrt(2 * np.pi)
+    return sigma * (z * cdf + pdf)
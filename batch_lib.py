@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Headless runner of the ColdLab measurements.
+
+Runs the :mod:`measurement_lib` routines and the :mod:`calibration_lib`
+bring-up from a job file, without Tk, so calibrations can run unattended on
+the measurement nodes::
+
+    python batch_lib.py job.yaml --report report.json
+
+A job file (YAML, or JSON for ``.json`` files) describes the station, as for
+:func:`instrument_server_lib.open_station`, and the steps to run in order::
+
+    device: QB_1
+    station:
+      readout: {driver: "RS_lib:RohdeSchwarzSGS100A", address: "TCPIP0::10.0.0.5::inst0::INSTR"}
+      drive: {address: "TCPIP0::10.0.0.6::inst0::INSTR"}
+      digitizer: {driver: "my_card_lib:Card"}
+    settings:                      # routine keyword arguments, by routine name
+      resonator_punchout: {f_start: 7.0e+9, f_stop: 7.2e+9}
+    steps:
+      - routine: resonator_punchout
+      - routine: readout_fidelity
+        settings: {n_shots: 20000}
+      - calibrate: std_randomized_benchmarking
+        force: false
+
+Station entries with an ``address`` are opened through :mod:`connection_lib`,
+the others are created as ``driver(**settings)``. Routines save their
+datasets as usual and their calibrated quantities (:func:`recorded`, or
+the result keys listed in the ``record`` entry of the step, ``false`` for
+none) are recorded in the :class:`parameter_lib.ParameterStore` of
+``device``.
+
+The exit status is 0 if every step succeeded, 1 if a step failed and 2 if the
+job file or the station could not be loaded.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+DEFAULT_DRIVER = "RS_lib:RohdeSchwarzSGS100A"
+
+# calibrated quantities of the routines outside the bring-up graph, whose
+# nodes declare their own outputs; the other result entries (point counts,
+# settings...) only go to the dataset
+RECORDED = {
+    "ramsey_detuned": ("t2_star", "qubit_frequency"),
+    "flipping": ("eps",),
+    "drag_calibration": ("drag",),
+    "allxy_drag_training": ("drag",),
+    "readout_fidelity": ("fidelity",),
+    "readout_fr_optimization": ("fidelity",),
+    "dispersive_shift": ("chi",),
+    "fast_reset_test": ("reset_time",),
+    "time_of_flight": ("delay",),
+}
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    """Read a job file, JSON if its extension is ``.json``, YAML otherwise."""
+    with open(path) as file:
+        if path.lower().endswith(".json"):
+            config = json.load(file)
+        else:
+            import yaml
+            config = yaml.safe_load(file)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a mapping at the top level")
+    return config
+
+
+def load_job(path: str) -> Dict[str, Any]:
+    """Read a job file (see :func:`load_config`) that has ``steps``."""
+    job = load_config(path)
+    if not isinstance(job.get("steps"), list):
+        raise ValueError(f"{path}: a job needs a list of 'steps'")
+    return job
+
+
+def build_station(config: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Instruments of the station ``config``, by station name."""
+    import connection_lib
+    station = {}
+    for name, settings in config.items():
+        settings = dict(settings or {})
+        module, cls = settings.pop("driver", DEFAULT_DRIVER).split(":")
+        driver = getattr(importlib.import_module(module), cls)
+        if "address" in settings:
+            station[name] = connection_lib.open_instrument(
+                driver, name, settings.pop("address"), **settings)
+        else:
+            station[name] = driver(**settings)
+    return station
+
+
+def recorded(routine: str) -> Tuple[str, ...]:
+    """Result keys of ``routine`` recorded as calibrated quantities."""
+    import calibration_lib
+    for node in calibration_lib.BRING_UP:
+        if node[1].__name__ == routine:
+            return node[4]
+    return RECORDED.get(routine, ())
+
+
+def run_step(step: Dict[str, Any], station: Dict[str, Any], device: str,
+             settings: Dict[str, Dict[str, Any]], store: Any) -> Dict[str, Any]:
+    """
+    Run one step of a job: a ``routine`` of :mod:`measurement_lib` or the
+    ``calibrate`` of a bring-up target.
+
+    Returns:
+        The result of the routine, or the ``outputs`` and ``ran`` nodes of
+        the calibration.
+    """
+    import calibration_lib
+    import measurement_lib
+    if "calibrate" in step:
+        graph = calibration_lib.bring_up_graph(station, settings, device, store)
+        return graph.run(step["calibrate"], bool(step.get("force", False)))
+    routine = getattr(measurement_lib, step["routine"])
+    kwargs = dict(settings.get(routine.__name__, {}))
+    kwargs.update(step.get("settings") or {})
+    result = measurement_lib.run(routine, station, **kwargs)
+    quantities = step.get("record", True)
+    if quantities is True:
+        quantities = recorded(routine.__name__)
+    if quantities:
+        store.record_result(device, routine.__name__, result, quantities)
+    return result
+
+
+def run_job(job: Dict[str, Any], station: Dict[str, Any],
+            keep_going: bool = False) -> List[Dict[str, Any]]:
+    """
+    Run the steps of ``job`` on ``station``, stopping at the first failure
+    unless ``keep_going``.
+
+    Returns:
+        One report per step run: its ``step``, ``ok``, ``elapsed`` time and
+        ``result``, or ``error`` and ``traceback`` if it failed.
+    """
+    from parameter_lib import ParameterStore
+    device = job.get("device", "QB_1")
+    settings = job.get("settings") or {}
+    store = ParameterStore()
+    reports = []
+    try:
+        for step in job["steps"]:
+            label = step.get("routine") or f"calibrate {step.get('calibrate')}"
+            print(f"[{device}] {label} ...", flush=True)
+            start = time.perf_counter()
+            report: Dict[str, Any] = {"step": step}
+            try:
+                report["result"] = run_step(step, station, device, settings, store)
+                report["ok"] = True
+            except Exception as error:
+                report["ok"] = False
+                report["error"] = f"{type(error).__name__}: {error}"
+                if error.__cause__ is not None:
+                    report["error"] += f" ({error.__cause__})"
+                report["traceback"] = traceback.format_exc()
+            report["elapsed"] = time.perf_counter() - start
+            reports.append(report)
+            print(f"[{device}] {label}: "
+                  f"{'ok' if report['ok'] else report['error']} "
+                  f"({report['elapsed']:.1f} s)", flush=True)
+            if not report["ok"] and not keep_going:
+                break
+    finally:
+        store.close()
+    return reports
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run ColdLab measurements and calibrations from a job file.")
+    parser.add_argument("job", help="YAML or JSON job file")
+    parser.add_argument("--data-dir",
+                        help="dataset store, overrides COLDLAB_DATA_DIR")
+    parser.add_argument("--report", help="write the step reports to this JSON file")
+    parser.add_argument("--keep-going", action="store_true",
+                        help="run the remaining steps after a failure")
+    args = parser.parse_args(argv)
+    if args.data_dir:
+        # read by dataset_lib on import, which happens below
+        os.environ["COLDLAB_DATA_DIR"] = args.data_dir
+
+    try:
+        job = load_job(args.job)
+        station = build_station(job.get("station") or {})
+    except Exception as error:
+        print(f"{args.job}: {type(error).__name__}: {error}", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        reports = run_job(job, station, args.keep_going)
+    finally:
+        import connection_lib
+        connection_lib.close_all()
+
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(reports, file, indent=2, default=str)
+    ok = len(reports) == len(job["steps"]) and all(r["ok"] for r in reports)
+    return EXIT_OK if ok else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
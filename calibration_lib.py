@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+Calibration graph of a qubit, run incrementally.
+
+Every calibration of the bring-up (punch-out, qubit spectroscopy, Rabi,
+Ramsey, T1, readout, RB) is a :class:`CalibrationNode`: a
+:mod:`measurement_lib` routine with the nodes it depends on, the arguments
+it takes from their results, the results it publishes and how long those
+stay valid. :class:`CalibrationGraph` records the outcome of every node in
+the dataset cache; asked for a target, it only re-runs the ancestors that are
+missing, failed, expired or older than one of their own dependencies, and
+reuses the cached results of all the others.
+
+:class:`ParallelCalibration` runs the graphs of several qubits at once,
+never running two calibrations that need the same instrument at the same
+time.
+"""
+
+import inspect
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import (Any, Callable, Dict, FrozenSet, List, Optional, Sequence,
+                    Tuple)
+
+import numpy as np
+
+import measurement_lib
+from dataset_lib import load_cache, update_cache
+from parameter_lib import ParameterStore
+
+HOUR = 3600.0
+
+
+def _is_valid(value: Any) -> bool:
+    """Whether an output is present and, if numeric, finite."""
+    if value is None:
+        return False
+    try:
+        return bool(np.all(np.isfinite(value)))
+    except TypeError:
+        return True
+
+
+class CalibrationNode:
+    """
+    One calibration of the graph.
+
+    Args:
+        name: unique name of the node.
+        routine: the :mod:`measurement_lib` routine to run.
+        depends_on: names of the nodes that must be valid before this one.
+        inputs: routine arguments taken from dependency results, as
+            ``{argument: "node.result_key"}``.
+        outputs: result keys published to the nodes depending on this one;
+            the node fails if one of them is missing or not finite.
+        timeout: validity of the results, in seconds.
+        settings: fixed keyword arguments of the routine.
+    """
+
+    def __init__(self, name: str,
+                 routine: Callable[..., Dict[str, Any]],
+                 depends_on: Sequence[str] = (),
+                 inputs: Optional[Dict[str, str]] = None,
+                 outputs: Sequence[str] = (),
+                 timeout: float = 24 * HOUR,
+                 settings: Optional[Dict[str, Any]] = None) -> None:
+        self.name = name
+        self.routine = routine
+        self.depends_on = tuple(depends_on)
+        self.inputs = dict(inputs or {})
+        self.outputs = tuple(outputs)
+        self.timeout = timeout
+        self.settings = dict(settings or {})
+        for source in self.inputs.values():
+            if source.split(".")[0] not in self.depends_on:
+                raise ValueError(f"Input {source!r} of {name} is not taken "
+                                 "from one of its dependencies")
+
+
+class CalibrationGraph:
+    """
+    Dependency graph of the calibrations of one ``device``.
+
+    Args:
+        station: instruments passed to the routines, see
+            :func:`measurement_lib.run`.
+        device: qubit name, passed to the routines that take a ``device``
+            and used to key the cached records.
+        store: :class:`parameter_lib.ParameterStore` receiving the scalar
+            outputs of every successful calibration.
+    """
+
+    def __init__(self, station: Dict[str, Any], device: str = "QB_1",
+                 store: Optional[ParameterStore] = None) -> None:
+        self.station = station
+        self.device = device
+        self.store = store
+        self.nodes: Dict[str, CalibrationNode] = {}
+
+    def add(self, node: CalibrationNode) -> CalibrationNode:
+        missing = [name for name in node.depends_on if name not in self.nodes]
+        if missing:
+            raise KeyError(f"Unknown dependencies {missing} of {node.name}")
+        self.nodes[node.name] = node
+        return node
+
+    def _key(self, name: str) -> str:
+        return f"{self.device}/calibration/{name}"
+
+    def record(self, name: str) -> Optional[Dict[str, Any]]:
+        """Last cached outcome of node ``name``, None if it never ran."""
+        return load_cache(self._key(name))
+
+    def ancestors(self, target: str) -> List[str]:
+        """``target`` and all its ancestors, dependencies first."""
+        order: List[str] = []
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name not in self.nodes:
+                raise KeyError(f"Unknown calibration {name!r}")
+            for dependency in self.nodes[name].depends_on:
+                visit(dependency)
+            order.append(name)
+
+        visit(target)
+        return order
+
+    def is_stale(self, name: str, now: Optional[float] = None) -> bool:
+        """
+        Whether node ``name`` has to run again: it never ran, failed,
+        expired, or one of its dependencies ran after it.
+        """
+        now = time.time() if now is None else now
+        record = self.record(name)
+        if not record or not record["ok"]:
+            return True
+        if now - record["timestamp"] > self.nodes[name].timeout:
+            return True
+        for dependency in self.nodes[name].depends_on:
+            parent = self.record(dependency)
+            if not parent or parent["timestamp"] > record["timestamp"]:
+                return True
+        return False
+
+    def _run_node(self, node: CalibrationNode) -> Dict[str, Any]:
+        settings = dict(node.settings)
+        for argument, source in node.inputs.items():
+            parent, key = source.split(".", 1)
+            settings[argument] = self.record(parent)["outputs"][key]
+        parameters = inspect.signature(node.routine).parameters
+        if "device" in parameters:
+            settings.setdefault("device", self.device)
+        if "name" in parameters:
+            # the datasets of the qubits calibrated in parallel stay apart
+            settings.setdefault("name", f"{self.device}_{node.name}")
+        record = {"timestamp": time.time(), "ok": False}
+        try:
+            result = measurement_lib.run(node.routine, self.station, **settings)
+        except Exception as error:
+            record["error"] = f"{type(error).__name__}: {error}"
+            update_cache(self._key(node.name), record)
+            raise RuntimeError(f"Calibration {node.name} failed") from error
+        record["dataset"] = result.get("dataset")
+        invalid = [key for key in node.outputs if not _is_valid(result.get(key))]
+        if invalid:
+            # e.g. a spectroscopy that found no line: the node must run again
+            record["error"] = f"no valid {', '.join(invalid)} in the result"
+            update_cache(self._key(node.name), record)
+            raise RuntimeError(f"Calibration {node.name} failed: "
+                               f"{record['error']}")
+        record.update(ok=True, outputs={key: result[key] for key in node.outputs})
+        update_cache(self._key(node.name), record)
+        if self.store is not None:
+            self.store.record_result(self.device, node.name, result, node.outputs)
+        return record
+
+    def run(self, target: str, force: bool = False) -> Dict[str, Any]:
+        """
+        Bring ``target`` up to date.
+
+        The ancestors of ``target`` are checked dependencies first and only
+        the stale ones are run (all of them with ``force``). A failing node
+        stops the run with a ``RuntimeError``; the nodes validated before it
+        keep their records, so the next run resumes from the failure.
+
+        Returns:
+            The ``outputs`` of ``target`` and the list of nodes that ran,
+            ``ran``.
+        """
+        ran = []
+        for name in self.ancestors(target):
+            if force or self.is_stale(name):
+                self._run_node(self.nodes[name])
+                ran.append(name)
+        return {"outputs": self.record(target)["outputs"], "ran": ran}
+
+
+class ParallelCalibration:
+    """
+    Run the calibration graphs of several qubits concurrently.
+
+    The resources of a calibration are the station instruments its routine
+    takes, compared by identity: two qubits sharing the digitizer, or the
+    same drive source, never measure at the same time, while calibrations on
+    disjoint instruments run in parallel. Whenever a calibration finishes,
+    the ready ones (all dependencies done) whose resources are free are
+    started, the ones heading the longest remaining dependency chains first,
+    so the total time approaches that of the longest chain rather than the
+    sum of all calibrations.
+
+    Args:
+        graphs: one :class:`CalibrationGraph` per qubit, distinct devices.
+        max_workers: maximum number of calibrations running at once.
+    """
+
+    def __init__(self, graphs: Sequence[CalibrationGraph],
+                 max_workers: Optional[int] = None) -> None:
+        self.graphs = {graph.device: graph for graph in graphs}
+        self.max_workers = max_workers or len(self.graphs)
+
+    def resources(self, device: str, name: str) -> FrozenSet[int]:
+        graph = self.graphs[device]
+        parameters = inspect.signature(graph.nodes[name].routine).parameters
+        return frozenset(id(instrument) for key, instrument in graph.station.items()
+                         if key in parameters)
+
+    def run(self, target: str, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Bring ``target`` up to date on every device.
+
+        A failing calibration only stops the calibrations depending on it,
+        on its own device.
+
+        Returns:
+            Per device, the nodes that ``ran`` and the ``outputs`` of
+            ``target``, or the ``error`` that stopped it.
+        """
+        pending: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        depth: Dict[Tuple[str, str], int] = {}
+        for device, graph in self.graphs.items():
+            order = graph.ancestors(target)
+            for name in order:
+                pending[device, name] = graph.nodes[name].depends_on
+            for name in reversed(order):
+                children = [depth[device, child] for child in order
+                            if name in graph.nodes[child].depends_on]
+                depth[device, name] = 1 + max(children, default=0)
+        report = {device: {"ran": []} for device in self.graphs}
+        done, busy, running = set(), set(), {}
+
+        def ready() -> List[Tuple[str, str]]:
+            return sorted((job for job, depends_on in pending.items()
+                           if all((job[0], d) in done for d in depends_on)),
+                          key=lambda job: -depth[job])
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            while pending or running:
+                while True:
+                    fresh = [job for job in ready() if not force
+                             and not self.graphs[job[0]].is_stale(job[1])]
+                    if not fresh:
+                        break
+                    for job in fresh:
+                        del pending[job]
+                        done.add(job)
+                for job in ready():
+                    needed = self.resources(*job)
+                    if needed & busy or len(running) >= self.max_workers:
+                        continue
+                    del pending[job]
+                    busy |= needed
+                    graph = self.graphs[job[0]]
+                    future = executor.submit(graph._run_node, graph.nodes[job[1]])
+                    running[future] = (job, needed)
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    (device, name), needed = running.pop(future)
+                    busy -= needed
+                    if future.exception() is None:
+                        done.add((device, name))
+                        report[device]["ran"].append(name)
+                        continue
+                    report[device]["error"] = str(future.exception().__cause__
+                                                  or future.exception())
+                    for job in [job for job in pending if job[0] == device]:
+                        del pending[job]
+
+        for device, graph in self.graphs.items():
+            if "error" not in report[device]:
+                report[device]["outputs"] = graph.record(target)["outputs"]
+        return report
+
+
+# name, routine, dependencies, inputs, outputs, timeout of the single qubit
+# bring-up; resonator spectroscopy has no routine yet, the graph starts from
+# the punch-out. The pulses are calibrated in amplitude (the default Rabi
+# mode): the drive frequency and pi_power are passed to every node playing
+# drive pulses
+BRING_UP = (
+    ("resonator_punchout", measurement_lib.resonator_punchout, (), {},
+     ("readout_frequency", "readout_power"), 7 * 24 * HOUR),
+    ("qubit_spectroscopy", measurement_lib.qubit_spectroscopy,
+     ("resonator_punchout",),
+     {"readout_frequency": "resonator_punchout.readout_frequency",
+      "readout_power": "resonator_punchout.readout_power"},
+     ("qubit_frequency", "readout_frequency"), 24 * HOUR),
+    ("rabi_oscillation", measurement_lib.rabi_oscillation,
+     ("qubit_spectroscopy",),
+     {"drive_frequency": "qubit_spectroscopy.qubit_frequency"},
+     ("x_pi", "pi_power"), 12 * HOUR),
+    ("ramsey", measurement_lib.ramsey,
+     ("qubit_spectroscopy", "rabi_oscillation"),
+     {"qubit_frequency": "qubit_spectroscopy.qubit_frequency",
+      "pi_power": "rabi_oscillation.pi_power"},
+     ("t2_star", "qubit_frequency"), 4 * HOUR),
+    ("coherence_time", measurement_lib.coherence_time,
+     ("ramsey", "rabi_oscillation"),
+     {"qubit_frequency": "ramsey.qubit_frequency",
+      "pi_power": "rabi_oscillation.pi_power"},
+     ("tau",), 12 * HOUR),
+    ("single_shot_classification", measurement_lib.single_shot_classification,
+     ("coherence_time",), {}, ("fidelity",), 12 * HOUR),
+    ("std_randomized_benchmarking", measurement_lib.std_randomized_benchmarking,
+     ("single_shot_classification",), {}, ("error_per_clifford",), 24 * HOUR),
+)
+
+
+def bring_up_graph(station: Dict[str, Any],
+                   settings: Optional[Dict[str, Dict[str, Any]]] = None,
+                   device: str = "QB_1",
+                   store: Optional[ParameterStore] = None) -> CalibrationGraph:
+    """
+    The :data:`BRING_UP` graph of ``device``, with the routine ``settings``
+    keyed by routine name (as ``ColdLab.routine_settings``).
+    """
+    settings = settings or {}
+    graph = CalibrationGraph(station, device, store)
+    for name, routine, depends_on, inputs, outputs, timeout in BRING_UP:
+        graph.add(CalibrationNode(name, routine, depends_on, inputs, outputs,
+                                  timeout, settings.get(routine.__name__)))
+    return graph
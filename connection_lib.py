@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide pool of VISA instrument connections.
+
+Opening a :class:`qcodes.instrument.VisaInstrument` means a resource manager
+lookup, a new session and the ``*IDN?`` of ``connect_message``, which takes
+hundreds of milliseconds. :func:`open_instrument` does it once per VISA
+address and hands out the same instrument afterwards, so opening it again
+from the GUI or a script is free.
+
+Pooled instruments are checked before being handed out (the session must be
+open and, if idle for a while, answer ``*OPC?``) and their session is
+reopened in place when it is dead. A transaction that times out or hits a
+closed session also gets a fresh session, with the device buffers cleared;
+single queries are then sent again, but writes and compound messages (e.g.
+settings followed by ``*OPC?``) are not, since the device may already have
+executed them, and the error is raised. The instrument object itself is never
+replaced, so references kept by stations and routines stay valid.
+"""
+
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Type
+
+import pyvisa
+from pyvisa import constants
+
+# seconds a pooled instrument can stay unused before it is pinged again
+CHECK_INTERVAL = 10.0
+
+_POOL: Dict[str, Any] = {}
+_LAST_USED: Dict[str, float] = {}
+_LOCK = threading.RLock()
+
+_CONNECTION_ERRORS = (constants.StatusCode.error_timeout,
+                      constants.StatusCode.error_connection_lost,
+                      constants.StatusCode.error_invalid_object)
+
+
+def _is_connection_error(error: Exception) -> bool:
+    if isinstance(error, pyvisa.errors.InvalidSession):
+        return True
+    return (isinstance(error, pyvisa.errors.VisaIOError)
+            and error.error_code in _CONNECTION_ERRORS)
+
+
+def reconnect(instrument: Any, address: str) -> None:
+    """
+    Reopen the VISA session of ``instrument`` at ``address`` in place,
+    keeping its settings.
+    """
+    handle = instrument.visa_handle
+    termination = handle.write_termination
+    timeout = instrument.timeout.cache.get(get_if_invalid=False)
+    visalib = f"{handle.visalib.library_path}@{instrument.visabackend}"
+    try:
+        handle.close()
+    except pyvisa.errors.Error:
+        pass
+    instrument.set_address(address, visalib)
+    instrument.set_terminator(termination)
+    instrument.timeout.set(timeout)
+    try:
+        # drop a late answer to the transaction that failed
+        instrument.visa_handle.clear()
+    except (pyvisa.errors.Error, NotImplementedError):
+        # the device clear is optional, e.g. in pyvisa-sim
+        pass
+
+
+def _is_query(cmd: str) -> bool:
+    """Whether ``cmd`` is a single query, which can safely be sent again."""
+    cmd = cmd.strip()
+    return cmd.endswith("?") and ";" not in cmd
+
+
+def _with_retry(instrument: Any, address: str,
+                method: Callable[[str], Any]) -> Callable[[str], Any]:
+    @functools.wraps(method)
+    def call(cmd: str) -> Any:
+        try:
+            return method(cmd)
+        except (pyvisa.errors.VisaIOError, pyvisa.errors.InvalidSession) as error:
+            if not _is_connection_error(error):
+                raise
+            with _LOCK:
+                reconnect(instrument, address)
+            if not _is_query(cmd):
+                raise
+            return method(cmd)
+    return call
+
+
+def is_alive(instrument: Any, ping: bool = True) -> bool:
+    """
+    Whether the session of ``instrument`` is open and, with ``ping``, whether
+    it answers ``*OPC?``.
+    """
+    try:
+        instrument.visa_handle.session
+        if ping:
+            instrument.visa_handle.query("*OPC?")
+    except (pyvisa.errors.Error, OSError):
+        return False
+    return True
+
+
+def open_instrument(cls: Type[Any], name: str, address: str,
+                    **kwargs: Any) -> Any:
+    """
+    The pooled instrument at VISA ``address``, created as
+    ``cls(name, address, **kwargs)`` the first time.
+
+    A pooled instrument is returned as is if it was used less than
+    :data:`CHECK_INTERVAL` seconds ago and its session is open; otherwise it
+    is pinged first and its session reopened if it does not answer.
+
+    Raises:
+        ValueError: if ``address`` is already open as another ``name`` or
+            with a driver that is not a ``cls``.
+    """
+    with _LOCK:
+        instrument = _POOL.get(address)
+        if instrument is not None and (not isinstance(instrument, cls)
+                                       or instrument.name != name):
+            raise ValueError(f"{address} is already open as {instrument.name!r} "
+                             f"({type(instrument).__name__}), not as {name!r} "
+                             f"({cls.__name__})")
+        if instrument is None:
+            instrument = cls(name, address, **kwargs)
+            instrument.ask_raw = _with_retry(instrument, address,
+                                             instrument.ask_raw)
+            instrument.write_raw = _with_retry(instrument, address,
+                                               instrument.write_raw)
+            _POOL[address] = instrument
+        else:
+            idle = time.monotonic() - _LAST_USED.get(address, 0.0)
+            if not is_alive(instrument, ping=idle > CHECK_INTERVAL):
+                reconnect(instrument, address)
+        _LAST_USED[address] = time.monotonic()
+        return instrument
+
+
+def close_instrument(address: str) -> None:
+    """Close the pooled instrument at ``address`` and drop it from the pool."""
+    with _LOCK:
+        instrument = _POOL.pop(address, None)
+        _LAST_USED.pop(address, None)
+        if instrument is not None:
+            instrument.close()
+
+
+def close_all() -> None:
+    """Close every pooled instrument."""
+    with _LOCK:
+        for address in list(_POOL):
+            close_instrument(address)
+
+
+def pooled(address: str) -> Optional[Any]:
+    """The pooled instrument at ``address``, None if it was never opened."""
+    return _POOL.get(address)
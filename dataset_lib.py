@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Dataset store for the ColdLab measurement routines.
+
+Every routine writes its raw data as a single ``.npz`` file named
+``<timestamp>_<name>.npz`` inside :data:`DATA_DIR`. Metadata (sweep settings,
+fit results, instrument names) is stored next to the arrays as a JSON string
+so that a dataset can be reloaded without the code that produced it.
+
+Large single-shot streams go to the shot store instead: memory-mapped
+``.npy`` files in the ``shots`` subdirectory, filled batch by batch while the
+measurement runs (see :func:`create_shot_store`).
+
+Small values that routines want to remember between runs (e.g. the last
+known qubit frequency of a device) live in a JSON cache in the same
+directory, see :func:`load_cache` and :func:`update_cache`.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.environ.get("COLDLAB_DATA_DIR",
+                          "C:/Users/cold/Documents/ProveQucodes/driver_LNF/data")
+CACHE_FILE = "cache.json"
+_CACHE_LOCK = threading.Lock()
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, complex):
+        return [value.real, value.imag]
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _reserve_path(directory: str, name: str, extension: str) -> str:
+    """
+    Create and return a new empty file ``<timestamp>_<name>[_<n>]<extension>``
+    in ``directory``. The file is created exclusively, so concurrent calls
+    (e.g. the calibrations of several qubits) never get the same path.
+    """
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{stamp}_{name}{extension}")
+    counter = 1
+    while True:
+        try:
+            with open(path, "xb"):
+                return path
+        except FileExistsError:
+            path = os.path.join(directory, f"{stamp}_{name}_{counter}{extension}")
+            counter += 1
+
+
+def save_dataset(name: str,
+                 arrays: Dict[str, Any],
+                 metadata: Optional[Dict[str, Any]] = None,
+                 data_dir: Optional[str] = None) -> str:
+    """
+    Save ``arrays`` as a new dataset and return the path of the file.
+
+    Args:
+        name: short name of the measurement, used in the file name.
+        arrays: mapping of column name to array-like data.
+        metadata: JSON serializable settings and results of the measurement.
+        data_dir: directory of the store, defaults to :data:`DATA_DIR`.
+    """
+    data_dir = data_dir or DATA_DIR
+    os.makedirs(data_dir, exist_ok=True)
+    path = _reserve_path(data_dir, name, ".npz")
+    meta = dict(metadata or {})
+    meta.setdefault("name", name)
+    meta.setdefault("timestamp", time.time())
+    np.savez(path, __metadata__=np.array(json.dumps(meta, default=_to_json)),
+             **{key: np.asarray(value) for key, value in arrays.items()})
+    return path
+
+
+def load_dataset(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Load a dataset written by :func:`save_dataset` as ``(arrays, metadata)``."""
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files if key != "__metadata__"}
+        metadata = json.loads(str(data["__metadata__"]))
+    return arrays, metadata
+
+
+def create_shot_store(name: str,
+                      shape: Tuple[int, ...],
+                      dtype: Any = np.int8,
+                      metadata: Optional[Dict[str, Any]] = None,
+                      data_dir: Optional[str] = None) -> np.memmap:
+    """
+    Create a memory-mapped shot file of ``shape`` and ``dtype``.
+
+    The file is ``shots/<timestamp>_<name>.npy`` in the store, with the
+    ``metadata`` in a ``.json`` file next to it. Routines write their batches
+    into the returned array and call its ``flush`` method; the shots never
+    need to fit in memory. The path of the file is ``store.filename``.
+    """
+    shot_dir = os.path.join(data_dir or DATA_DIR, "shots")
+    os.makedirs(shot_dir, exist_ok=True)
+    path = _reserve_path(shot_dir, name, ".npy")
+    meta = dict(metadata or {})
+    meta.setdefault("name", name)
+    meta.setdefault("timestamp", time.time())
+    with open(path[:-4] + ".json", "w") as file:
+        json.dump(meta, file, default=_to_json)
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+
+def load_shots(path: str) -> Tuple[np.memmap, Dict[str, Any]]:
+    """Open a shot file of :func:`create_shot_store` read-only, with its metadata."""
+    with open(path[:-4] + ".json") as file:
+        metadata = json.load(file)
+    return np.load(path, mmap_mode="r"), metadata
+
+
+def load_cache(key: str, default: Any = None,
+               data_dir: Optional[str] = None) -> Any:
+    """
+    Return the cached value of ``key``, ``default`` if it was never stored.
+    Holds the lock of :func:`update_cache`, so the file is never read while
+    it is being replaced.
+    """
+    path = os.path.join(data_dir or DATA_DIR, CACHE_FILE)
+    with _CACHE_LOCK:
+        try:
+            with open(path) as file:
+                return json.load(file).get(key, default)
+        except (FileNotFoundError, ValueError):
+            return default
+
+
+def update_cache(key: str, value: Any, data_dir: Optional[str] = None) -> None:
+    """
+    Store ``value`` under ``key`` in the cache, keeping the other keys.
+    Safe to call from several threads at once.
+    """
+    data_dir = data_dir or DATA_DIR
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, CACHE_FILE)
+    with _CACHE_LOCK:
+        try:
+            with open(path) as file:
+                cache = json.load(file)
+        except (FileNotFoundError, ValueError):
+            cache = {}
+        cache[key] = value
+        tmp = path + ".tmp"
+        with open(tmp, "w") as file:
+            json.dump(cache, file, indent=1, default=_to_json)
+        os.replace(tmp, path)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Acquisition interface used by the ColdLab measurement routines.
+
+The routines never talk to a specific card: they only rely on the methods of
+:class:`Digitizer`, so any acquisition board (or a simulated one) can be
+plugged in by subclassing it.
+"""
+
+import numpy as np
+
+
+class Digitizer:
+    """
+    Base class of the digitizers used by the measurement routines.
+
+    Subclasses implement the acquisition methods they support; the others
+    raise ``NotImplementedError``.
+    """
+
+    name = "digitizer"
+    #: sampling rate (samples per second) and length of the raw traces
+    sample_rate = 1e9
+    trace_length = 1024
+
+    def acquire(self) -> complex:
+        """Return the averaged IQ value for the current instrument settings."""
+        raise NotImplementedError
+
+    def acquire_shots(self, n_shots: int) -> np.ndarray:
+        """Return ``n_shots`` single-shot IQ values (complex array)."""
+        raise NotImplementedError
+
+    def acquire_repeated_shots(self, n_shots: int, n_readouts: int) -> np.ndarray:
+        """
+        Return ``(n_readouts, n_shots)`` IQ values of ``n_readouts``
+        back-to-back readouts in each of ``n_shots`` repetitions.
+        """
+        raise NotImplementedError
+
+    def acquire_sweep(self, n_points: int) -> np.ndarray:
+        """
+        Return ``n_points`` averaged IQ values (complex array) of a hardware
+        sweep: the swept source starts on its first point and the digitizer
+        (or the sequencer it drives) sends the source one trigger after each
+        point to step it to the next.
+        """
+        raise NotImplementedError
+
+    def acquire_traces(self, out: np.ndarray) -> None:
+        """
+        Fill ``out``, a ``(n_traces, trace_length)`` real array, with raw ADC
+        traces. Implementations write into ``out`` in place, so the caller
+        can reuse the same buffer for every batch.
+        """
+        raise NotImplementedError
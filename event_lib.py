@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Change events of instrument parameters.
+
+:func:`observe` makes every ``get`` and ``set`` of the parameters of a QCoDeS
+instrument publish a :class:`ParameterEvent` on an :class:`EventBus`, so
+GUI widgets and loggers follow the generator state without issuing their own
+SCPI queries.
+
+Events are coalesced per parameter: the first value is delivered at once,
+further values within ``window`` seconds are held back and only the latest
+is delivered when the window closes. A sweep setting the frequency a
+thousand times a second therefore costs subscribers about ``1 / window``
+calls per second, and they always end up with the final value.
+"""
+
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class ParameterEvent(NamedTuple):
+    instrument: str
+    parameter: str
+    value: Any
+    source: str  # "get" or "set"
+    timestamp: float
+
+
+class EventBus:
+    """
+    Publish/subscribe of :class:`ParameterEvent`, coalesced per parameter.
+
+    Subscribers are called from the publishing thread, or from a timer
+    thread for the values held back by the coalescing window.
+
+    Args:
+        window: coalescing window in seconds, 0 to deliver every event.
+    """
+
+    def __init__(self, window: float = 0.1) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._tokens = itertools.count()
+        self._subscribers: Dict[int, Tuple[Callable[[ParameterEvent], None],
+                                           Optional[str], Optional[str]]] = {}
+        # parameters with an open window, and the event held back in it
+        self._windows: Dict[Tuple[str, str], Optional[ParameterEvent]] = {}
+
+    def subscribe(self, callback: Callable[[ParameterEvent], None],
+                  instrument: Optional[str] = None,
+                  parameter: Optional[str] = None) -> int:
+        """
+        Call ``callback(event)`` for the events of ``instrument`` and
+        ``parameter`` (all of them if None); returns a token for
+        :meth:`unsubscribe`.
+        """
+        token = next(self._tokens)
+        with self._lock:
+            self._subscribers[token] = (callback, instrument, parameter)
+        return token
+
+    def unsubscribe(self, token: int) -> None:
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def _deliver(self, event: ParameterEvent) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for callback, instrument, parameter in subscribers:
+            if instrument in (None, event.instrument) and \
+                    parameter in (None, event.parameter):
+                callback(event)
+
+    def _open_window(self, key: Tuple[str, str], event: ParameterEvent) -> None:
+        """Deliver ``event`` and hold back the next ones for ``window`` s."""
+        timer = threading.Timer(self.window, self._close_window, (key,))
+        timer.daemon = True
+        timer.start()
+        self._deliver(event)
+
+    def _close_window(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            held = self._windows.pop(key)
+            if held is not None:
+                self._windows[key] = None
+        if held is not None:
+            self._open_window(key, held)
+
+    def publish(self, instrument: str, parameter: str, value: Any,
+                source: str) -> None:
+        event = ParameterEvent(instrument, parameter, value, source, time.time())
+        if self.window <= 0:
+            self._deliver(event)
+            return
+        key = (instrument, parameter)
+        with self._lock:
+            if key in self._windows:
+                self._windows[key] = event
+                return
+            self._windows[key] = None
+        self._open_window(key, event)
+
+    def flush(self) -> None:
+        """Deliver the held values now instead of at the end of their window."""
+        with self._lock:
+            held = [event for event in self._windows.values() if event is not None]
+            for event in held:
+                self._windows[event.instrument, event.parameter] = None
+        for event in held:
+            self._deliver(event)
+
+
+def observe(instrument: Any, bus: EventBus) -> EventBus:
+    """
+    Publish on ``bus`` the value of every ``get`` and ``set`` of the
+    parameters of ``instrument``; returns ``bus``.
+
+    Writes that bypass ``set`` and only record the new value with
+    ``parameter.cache.set`` (such as the batched transactions of
+    :class:`station_lib.StationState`) are published as ``"set"`` too.
+    """
+    for name, parameter in instrument.parameters.items():
+        wrapped = vars(parameter)
+        if "get" in wrapped:
+            parameter.get = _publishing_get(bus, instrument.name, name,
+                                            wrapped["get"])
+        if "set" in wrapped:
+            parameter.set = _publishing_set(bus, instrument.name, name,
+                                            wrapped["set"])
+            parameter.cache.set = _publishing_set(bus, instrument.name, name,
+                                                  parameter.cache.set)
+    return bus
+
+
+def _publishing_get(bus: EventBus, instrument: str, name: str,
+                    get: Callable[[], Any]) -> Callable[[], Any]:
+    def publishing_get() -> Any:
+        value = get()
+        bus.publish(instrument, name, value, "get")
+        return value
+    return publishing_get
+
+
+def _publishing_set(bus: EventBus, instrument: str, name: str,
+                    set_: Callable[..., None]) -> Callable[..., None]:
+    def publishing_set(value: Any, **kwargs: Any) -> None:
+        set_(value, **kwargs)
+        bus.publish(instrument, name, value, "set")
+    return publishing_set
@@ -1,11 +1,20 @@
+import os
 import tkinter as tk
-import pandas as pd
+from tkinter import messagebox
+
+
 class ColdLab:
     def __init__(self,root):
         self.menubar = tk.Menu(root)
         self.root = root
         self.root.title("Cold Laboratory")
         self.root.config(menu=self.menubar)
+        # instruments bound by name to the measurement routines, e.g.
+        # {"readout": RohdeSchwarzSGS100A, "digitizer": Digitizer}
+        self.station = {}
+        # keyword arguments of each routine, keyed by the routine name
+        self.routine_settings = {}
+        self.device = "QB_1"
 
         self.modify_root_geometry()
         self.create_instrument_menu()
@@ -20,7 +29,8 @@ class ColdLab:
         self.root.geometry("600x600")
         self.root.title("COLD Laboratory")
         self.root.resizable(height=None, width= None)
-        self.bg = tk.PhotoImage(file="C:/Users/cold/Documents/ProveQucodes/driver_LNF/Logo-COLD-lab.png")
+        self.bg = tk.PhotoImage(file=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  "Logo-COLD-lab.png"))
         self.root.configure(background="white")
         self.bg_label=tk.Label((self.root),image=self.bg)
         self.bg_label.place(relwidth=1, relheight=1)
@@ -32,8 +42,43 @@ class ColdLab:
     def RS_SMA100B_instrument():
         pass
 
-    def RS_SGS100A_instrument():
-        pass
+    def load_station(self):
+        """
+        Load the station, device and routine settings of a batch_lib job
+        file (its steps are ignored).
+        """
+        from tkinter.filedialog import askopenfilename
+        import batch_lib
+        path = askopenfilename(title="Station and settings",
+                               filetypes=[("Job files", "*.yaml *.yml *.json"),
+                                          ("All files", "*")])
+        if not path:
+            return None
+        try:
+            config = batch_lib.load_config(path)
+            self.station.update(batch_lib.build_station(config.get("station") or {}))
+        except Exception as error:
+            messagebox.showerror("Load station", str(error))
+            return None
+        self.device = config.get("device", self.device)
+        self.routine_settings.update(config.get("settings") or {})
+        return self.station
+
+    def RS_SGS100A_instrument(self):
+        from tkinter.simpledialog import askstring
+        import connection_lib
+        from RS_lib import RohdeSchwarzSGS100A
+        role = askstring("RS_SGS100A", "Station name (readout, drive...):")
+        address = askstring("RS_SGS100A", "VISA address:")
+        if not role or not address:
+            return None
+        try:
+            self.station[role] = connection_lib.open_instrument(
+                RohdeSchwarzSGS100A, role, address)
+        except Exception as error:
+            messagebox.showerror("RS_SGS100A", str(error))
+            return None
+        return self.station[role]
     def Signal_Hound_instrument():
         pass
 
@@ -70,53 +115,52 @@ class ColdLab:
     def QB_1():
         pass
 
-    def std_randomized_benchmarking():
-        print("Std randomized benchmarking")
-        pass
+    def std_randomized_benchmarking(self):
+        self.run_routine("std_randomized_benchmarking")
     #--------- low level characterization single qubit
-    def rabi_oscillation():
-        pass
-    def T12():
-        pass
+    def rabi_oscillation(self):
+        self.run_routine("rabi_oscillation")
+    def T12(self):
+        self.run_routine("coherence_time")
 
-    def single_shot_class():
-        pass
-    def AllXY_DragPulseTraining():
-        pass
+    def single_shot_class(self):
+        self.run_routine("single_shot_classification")
+    def AllXY_DragPulseTraining(self):
+        self.run_routine("allxy_drag_training")
 
-    def flipping():
-        pass
+    def flipping(self):
+        self.run_routine("flipping")
 
-    def dispersive_shift():
-        pass
+    def dispersive_shift(self):
+        self.run_routine("dispersive_shift")
 
-    def readout_fr_optimization():
-        pass
+    def readout_fr_optimization(self):
+        self.run_routine("readout_fr_optimization")
 
-    def fast_rst_test():
-        pass
+    def fast_rst_test(self):
+        self.run_routine("fast_reset_test")
 
-    def ToF_readout():
-        pass
+    def ToF_readout(self):
+        self.run_routine("time_of_flight")
 
     def resonator_spec():
         pass
     
-    def resonator_po():
-        pass
-    def resonator_flux_dependance():
-        pass
+    def resonator_po(self):
+        self.run_routine("resonator_punchout")
+    def resonator_flux_dependance(self):
+        self.run_routine("resonator_flux_dependance")
 
-    def qubit_spec():
-        pass
+    def qubit_spec(self):
+        self.run_routine("qubit_spectroscopy")
 
-    def qubit_flux_dependance():
-        pass
-    def ramsey_std():
-        pass
+    def qubit_flux_dependance(self):
+        self.run_routine("qubit_flux_dependance")
+    def ramsey_std(self):
+        self.run_routine("ramsey")
 
-    def ramsey_detuned():
-        pass
+    def ramsey_detuned(self):
+        self.run_routine("ramsey_detuned")
     """  
             self.entry = tk.Entry(root)
             self.entry.pack()
@@ -128,22 +172,54 @@ class ColdLab:
     def RS():
         pass
 
+    def run_routine(self, name):
+        # measurement_lib pulls in NumPy, SciPy and the analysis code: import
+        # it on the first measurement, not when the window opens
+        import inspect
+        import measurement_lib
+        routine = getattr(measurement_lib, name)
+        settings = dict(self.routine_settings.get(name, {}))
+        if "device" in inspect.signature(routine).parameters:
+            settings.setdefault("device", self.device)
+        missing = [argument for argument, parameter
+                   in inspect.signature(routine).parameters.items()
+                   if parameter.default is inspect.Parameter.empty
+                   and argument not in self.station and argument not in settings]
+        if missing:
+            messagebox.showerror(name, f"Missing {', '.join(missing)}: load the "
+                                 "station and the routine settings with "
+                                 "Instrument > Load station and settings...")
+            return None
+        try:
+            self.result = measurement_lib.run(routine, self.station, **settings)
+        except Exception as error:
+            messagebox.showerror(name, str(error))
+            return None
+        print(f"{name}: {self.result}")
+        return self.result
+
     def fidelity(self):
         
         self.open_window()
         self.submit_parameters()
-        pass
+        self.run_routine("readout_fidelity")
 
     def QNDness(self):
-        from tkinter.simpledialog import askstring
-        self.result = askstring("Input", "Enter something:")
-        if self.result:
-            self.result_label = tk.Label(text="")
-            self.result_label.pack()
-            self.result_label.config(text=f"You entered: {self.result}")
-       
-        pass
-
+        self.run_routine("qndness")
+
+    def bring_up(self):
+        import calibration_lib
+        import parameter_lib
+        graph = calibration_lib.bring_up_graph(self.station, self.routine_settings,
+                                               self.device,
+                                               parameter_lib.ParameterStore())
+        try:
+            self.result = graph.run("std_randomized_benchmarking")
+        except Exception as error:
+            messagebox.showerror("Bring-up", f"{error}: {error.__cause__}")
+            return None
+        print(f"bring-up: {self.result}")
+        return self.result
 
     def help_menu():
         pass
@@ -182,6 +258,8 @@ class ColdLab:
 
     def create_instrument_menu(self):
         self.instrument_menu = tk.Menu(self.menubar, tearoff=0)
+        self.instrument_menu.add_command(label="Load station and settings...", command=self.load_station)
+        self.instrument_menu.add_separator()
         self.instrument_submenu = tk.Menu(self.instrument_menu)
         self.instrument_submenu.add_command(label="RS_SMA100B",command=self.RS_SMA100B_instrument)
         self.instrument_submenu.add_command(label="RS_SGS100A", command=self.RS_SGS100A_instrument)
@@ -229,6 +307,7 @@ class ColdLab:
         self.menubar.add_cascade(label="Calibration",menu=self.calibration_menu)
         self.calibration_submenu = tk.Menu(self.calibration_menu)
         self.calibration_menu.add_cascade(label="Sigle Qubit", menu=self.calibration_submenu)
+        self.calibration_submenu.add_command(label="Bring-up (stale only)", command=self.bring_up)
 
         self.calibration_subsubmenu_gateset = tk.Menu(self.menubar,tearoff=0)
         self.calibration_subsubmenu_gateset.add_command(label ="Std randomized benchmarking", command=self.std_randomized_benchmarking )
@@ -272,40 +351,17 @@ class ColdLab:
 
 #---------------
     def submit_parameters(self):
-        self.parameter_entries = {}
-        for parameter, entry in self.parameter_entries.items():
-            self.value = entry.get()
-            print(f"{parameter}: {self.value}")      
-        self.parameters = ["Parameter_1", "Parameter_2", "Parameter_3", "Parameter_4"]
-        for parameter in self.parameters:
-            self.label = tk.Label(self.new_window, text=parameter)
-            self.label.pack()
-            self.entry = tk.Entry(self.new_window)
-            self.entry.pack()
-            self.parameter_entries[parameter] = self.entry
-            pass
-        self.submit_button = tk.Button(self.new_window, text="Submit", command=self.print_parameters)
-        self.submit_button.pack()
-
-   
-    df= pd.DataFrame(columns=['parameter'])
-    def print_parameters(self):  
-        self.parameter_saved=[]
-        self.value_saved=[]
-
-        for parameter, entry in self.parameter_entries.items():
-            self.value = entry.get()
-            self.parameter_saved.append(parameter)
-            self.value_saved.append(self.value)
-      
-        self.df['parameter'] = self.parameter_saved
-        
-
-        self.new_column_name = f'value_{len(self.df.columns) - 1}'
-        self.df[self.new_column_name] = self.value_saved
+        import panel_lib
+        self.panels = {}
+        for name, instrument in self.station.items():
+            if not hasattr(instrument, "parameters"):
+                continue
+            tk.Label(self.new_window, text=name).pack()
+            self.panels[name] = panel_lib.ParameterPanel(self.new_window, instrument)
+            self.panels[name].pack(fill="both", expand=True)
+        if not self.panels:
+            tk.Label(self.new_window, text="No instrument in the station.").pack()
 
-        self.df.to_csv("C:/Users/cold/Documents/ProveQucodes/driver_LNF/dataframe.csv")
-           
 #----------
     """
     first_button = tk.Button(text="Start measurement", command=start_measurement)
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+Instrument server: one process owns the generators, every client shares them.
+
+The server holds the QCoDeS instruments (``RohdeSchwarzSGS100A`` by default,
+opened through :mod:`connection_lib`) and exposes their parameters on a
+local TCP socket, so notebooks and the ColdLab GUI no longer open competing
+VISA sessions on the same generator. Run it with::
+
+    python instrument_server_lib.py station.json [port]
+
+where ``station.json`` maps station names to ``{"address": ..., "driver":
+"module:Class", ...}`` (extra keys are passed to the driver). Without
+hardware, use ``{"drive": {"driver": "sim_lib:SimulatedSGS100A", "address":
+"GPIB::1::INSTR"}}``; ``python sim_lib.py`` checks the server that way.
+
+Protocol: every frame is a ``!IBI`` header (payload length, opcode, request
+id) followed by a payload of tagged values (see :func:`pack`). Requests are
+``GET``, ``SET``, ``SUBSCRIBE`` and ``UNSUBSCRIBE`` of ``(instrument,
+parameter[, value])``; the server answers ``REPLY`` or ``ERROR`` with the
+request id, and pushes ``EVENT (instrument, parameter, value)`` frames to
+the subscribers of a parameter whenever a get or set changes its value.
+
+Reads of the same parameter are coalesced: clients asking while a read is in
+flight wait for its result instead of queuing their own query, and results
+younger than ``read_window`` seconds are served from memory.
+"""
+
+import importlib
+import itertools
+import json
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+DEFAULT_PORT = 50555
+
+GET, SET, SUBSCRIBE, UNSUBSCRIBE = 1, 2, 3, 4
+REPLY, ERROR, EVENT = 0x80, 0x81, 0x82
+
+_HEADER = struct.Struct("!IBI")
+
+
+#--------- wire format
+
+def _pack_value(value: Any, out: List[bytes]) -> None:
+    if value is None:
+        out.append(b"n")
+    elif isinstance(value, bool):
+        out.append(b"t" if value else b"f")
+    elif isinstance(value, int):
+        out.append(b"i" + struct.pack("!q", value))
+    elif isinstance(value, float):
+        out.append(b"d" + struct.pack("!d", value))
+    elif isinstance(value, str):
+        data = value.encode()
+        out.append(b"s" + struct.pack("!I", len(data)) + data)
+    elif isinstance(value, (list, tuple)):
+        out.append(b"l" + struct.pack("!I", len(value)))
+        for item in value:
+            _pack_value(item, out)
+    elif hasattr(value, "item"):
+        _pack_value(value.item(), out)
+    else:
+        raise TypeError(f"Cannot send {type(value).__name__} values")
+
+
+def pack(*values: Any) -> bytes:
+    """
+    Encode ``values`` as one tag byte each (``n`` None, ``t``/``f`` bool,
+    ``i`` int64, ``d`` float64, ``s`` UTF-8 string, ``l`` list) followed by
+    its big-endian data.
+    """
+    out: List[bytes] = []
+    for value in values:
+        _pack_value(value, out)
+    return b"".join(out)
+
+
+def _unpack_value(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag, offset = data[offset:offset + 1], offset + 1
+    if tag == b"n":
+        return None, offset
+    if tag in (b"t", b"f"):
+        return tag == b"t", offset
+    if tag == b"i":
+        return struct.unpack_from("!q", data, offset)[0], offset + 8
+    if tag == b"d":
+        return struct.unpack_from("!d", data, offset)[0], offset + 8
+    (size,) = struct.unpack_from("!I", data, offset)
+    offset += 4
+    if tag == b"s":
+        return data[offset:offset + size].decode(), offset + size
+    if tag == b"l":
+        items = []
+        for _ in range(size):
+            item, offset = _unpack_value(data, offset)
+            items.append(item)
+        return items, offset
+    raise ValueError(f"Unknown tag {tag!r}")
+
+
+def unpack(data: bytes) -> List[Any]:
+    """Decode a payload written by :func:`pack`."""
+    values, offset = [], 0
+    while offset < len(data):
+        value, offset = _unpack_value(data, offset)
+        values.append(value)
+    return values
+
+
+def _receive(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_frame(sock: socket.socket) -> Tuple[int, int, List[Any]]:
+    """Read one frame as ``(opcode, request_id, values)``."""
+    size, opcode, request_id = _HEADER.unpack(_receive(sock, _HEADER.size))
+    return opcode, request_id, unpack(_receive(sock, size))
+
+
+def frame(opcode: int, request_id: int, *values: Any) -> bytes:
+    payload = pack(*values)
+    return _HEADER.pack(len(payload), opcode, request_id) + payload
+
+
+#--------- server
+
+class InstrumentServer:
+    """
+    Serve the parameters of ``instruments`` (QCoDeS instruments by name).
+
+    Each instrument is only accessed by one thread at a time. Call
+    :meth:`start` to serve from a background thread, :meth:`serve_forever`
+    to block, :meth:`shutdown` to stop.
+
+    Args:
+        instruments: instruments by station name.
+        host, port: listening address, ``port=0`` picks a free port (see
+            :attr:`address`).
+        read_window: seconds during which a read result is reused.
+    """
+
+    def __init__(self, instruments: Dict[str, Any], host: str = "127.0.0.1",
+                 port: int = DEFAULT_PORT, read_window: float = 0.0) -> None:
+        self.instruments = instruments
+        self.read_window = read_window
+        self._locks = {name: threading.Lock() for name in instruments}
+        self._state_lock = threading.Lock()
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._last_read: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._published: Dict[Tuple[str, str], Any] = {}
+        self._subscribers: Dict[Tuple[str, str], Set["_Connection"]] = {}
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                server._handle(_Connection(self.request))
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler,
+                                                       bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address
+
+    def start(self) -> "InstrumentServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _parameter(self, instrument: str, parameter: str) -> Any:
+        try:
+            return self.instruments[instrument].parameters[parameter]
+        except KeyError:
+            raise KeyError(f"Unknown parameter {instrument}.{parameter}") from None
+
+    def get(self, instrument: str, parameter: str) -> Any:
+        """Read a parameter, sharing the result with concurrent readers."""
+        key = (instrument, parameter)
+        with self._state_lock:
+            last = self._last_read.get(key)
+            if last and time.monotonic() - last[0] <= self.read_window:
+                return last[1]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            with self._locks[instrument]:
+                value = self._parameter(instrument, parameter).get()
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._state_lock:
+                del self._in_flight[key]
+        future.set_result(value)
+        with self._state_lock:
+            self._last_read[key] = (time.monotonic(), value)
+        self._publish(key, value)
+        return value
+
+    def set(self, instrument: str, parameter: str, value: Any) -> None:
+        key = (instrument, parameter)
+        with self._locks[instrument]:
+            self._parameter(instrument, parameter).set(value)
+        with self._state_lock:
+            self._last_read.pop(key, None)
+        self._publish(key, value)
+
+    def _publish(self, key: Tuple[str, str], value: Any) -> None:
+        with self._state_lock:
+            if key in self._published and self._published[key] == value:
+                return
+            self._published[key] = value
+            subscribers = list(self._subscribers.get(key, ()))
+        message = frame(EVENT, 0, key[0], key[1], value)
+        for connection in subscribers:
+            connection.send(message)
+
+    def _handle(self, connection: "_Connection") -> None:
+        try:
+            while True:
+                opcode, request_id, args = read_frame(connection.sock)
+                try:
+                    if opcode == GET:
+                        result = self.get(*args)
+                    elif opcode == SET:
+                        result = self.set(*args)
+                    elif opcode in (SUBSCRIBE, UNSUBSCRIBE):
+                        self._parameter(*args)
+                        with self._state_lock:
+                            subscribers = self._subscribers.setdefault(tuple(args),
+                                                                       set())
+                            if opcode == SUBSCRIBE:
+                                subscribers.add(connection)
+                            else:
+                                subscribers.discard(connection)
+                        result = None
+                    else:
+                        raise ValueError(f"Unknown opcode {opcode}")
+                except Exception as error:
+                    connection.send(frame(ERROR, request_id,
+                                          f"{type(error).__name__}: {error}"))
+                else:
+                    connection.send(frame(REPLY, request_id, result))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._state_lock:
+                for subscribers in self._subscribers.values():
+                    subscribers.discard(connection)
+
+
+class _Connection:
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self._lock = threading.Lock()
+
+    def send(self, data: bytes) -> None:
+        with self._lock:
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                pass
+
+
+#--------- client
+
+class InstrumentClient:
+    """
+    Connection to an :class:`InstrumentServer`, safe to share between threads.
+
+    Event callbacks run in the receiving thread of the client; they must not
+    block on requests to the server.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 timeout: float = 10.0) -> None:
+        self.timeout = timeout
+        self._sock = socket.create_connection((host, port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._callbacks: Dict[Tuple[str, str], List[Callable[[Any], None]]] = {}
+        threading.Thread(target=self._receive, daemon=True).start()
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def _request(self, opcode: int, *args: Any) -> Any:
+        request_id = next(self._ids)
+        future = self._pending[request_id] = Future()
+        with self._send_lock:
+            self._sock.sendall(frame(opcode, request_id, *args))
+        return future.result(self.timeout)
+
+    def _receive(self) -> None:
+        try:
+            while True:
+                opcode, request_id, values = read_frame(self._sock)
+                if opcode == EVENT:
+                    instrument, parameter, value = values
+                    for callback in self._callbacks.get((instrument, parameter), ()):
+                        callback(value)
+                    continue
+                future = self._pending.pop(request_id)
+                if opcode == ERROR:
+                    future.set_exception(RuntimeError(values[0]))
+                else:
+                    future.set_result(values[0])
+        except (ConnectionError, OSError) as error:
+            for future in self._pending.values():
+                future.set_exception(error)
+
+    def get(self, instrument: str, parameter: str) -> Any:
+        return self._request(GET, instrument, parameter)
+
+    def set(self, instrument: str, parameter: str, value: Any) -> None:
+        self._request(SET, instrument, parameter, value)
+
+    def subscribe(self, instrument: str, parameter: str,
+                  callback: Callable[[Any], None]) -> None:
+        """Call ``callback(value)`` whenever the server sees a new value."""
+        callbacks = self._callbacks.setdefault((instrument, parameter), [])
+        callbacks.append(callback)
+        if len(callbacks) == 1:
+            self._request(SUBSCRIBE, instrument, parameter)
+
+    def unsubscribe(self, instrument: str, parameter: str) -> None:
+        self._callbacks.pop((instrument, parameter), None)
+        self._request(UNSUBSCRIBE, instrument, parameter)
+
+    def instrument(self, name: str) -> "RemoteInstrument":
+        return RemoteInstrument(self, name)
+
+
+class RemoteParameter:
+    """Parameter of a served instrument, called like a QCoDeS parameter."""
+
+    def __init__(self, client: InstrumentClient, instrument: str,
+                 name: str) -> None:
+        self.client = client
+        self.instrument = instrument
+        self.name = name
+
+    def __call__(self, *value: Any) -> Any:
+        if value:
+            return self.client.set(self.instrument, self.name, value[0])
+        return self.client.get(self.instrument, self.name)
+
+
+class RemoteInstrument:
+    """
+    Served instrument usable in place of the local driver in a station:
+    ``remote.frequency(7e9)``, ``remote.power()``, ``remote.on()``.
+    """
+
+    def __init__(self, client: InstrumentClient, name: str) -> None:
+        self.client = client
+        self.name = name
+
+    def __getattr__(self, parameter: str) -> RemoteParameter:
+        if parameter.startswith("_"):
+            raise AttributeError(parameter)
+        return RemoteParameter(self.client, self.name, parameter)
+
+    def on(self) -> None:
+        self.client.set(self.name, "status", "on")
+
+    def off(self) -> None:
+        self.client.set(self.name, "status", "off")
+
+
+def open_station(config: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Open the instruments of a station configuration through
+    :mod:`connection_lib`.
+    """
+    import connection_lib
+    instruments = {}
+    for name, settings in config.items():
+        settings = dict(settings)
+        module, cls = settings.pop("driver", "RS_lib:RohdeSchwarzSGS100A").split(":")
+        driver = getattr(importlib.import_module(module), cls)
+        instruments[name] = connection_lib.open_instrument(
+            driver, name, settings.pop("address"), **settings)
+    return instruments
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    with open(argv[0]) as file:
+        config = json.load(file)
+    port = int(argv[1]) if len(argv) > 1 else DEFAULT_PORT
+    server = InstrumentServer(open_station(config), port=port)
+    print(f"Serving {', '.join(config)} on {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
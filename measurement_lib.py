@@ -0,0 +1,1256 @@
+# -*- coding: utf-8 -*-
+"""
+Measurement routines behind the ColdLab calibration menu.
+
+Each routine receives the instruments it needs as keyword arguments with a
+fixed name, so that the GUI (and any script) can bind them from a station
+dictionary with :func:`run`:
+
+- ``readout``: :class:`RS_lib.RohdeSchwarzSGS100A` generating the readout tone
+- ``drive``: :class:`RS_lib.RohdeSchwarzSGS100A` driving the qubit
+- ``flux``: settable parameter of the flux bias source (Agilent 33XXX
+  offset or National Instruments analog output), called as ``flux(value)``
+- ``digitizer``: a :class:`digitizer_lib.Digitizer`
+- ``sequencer``: plays the drive pulse sequences, ``sequencer.load(pulses)``
+  with a list of pulse names of :data:`pulse_lib.PULSE_DEFINITIONS`, e.g. a
+  :class:`pulse_lib.PulseCompiler`
+
+Routines return a dictionary with their fitted results and the path of the
+dataset written to the store of :mod:`dataset_lib`.
+"""
+
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+import RB_lib
+from analysis_lib import (ShotClassifier, assignment_fidelity,
+                          expected_improvement, find_resonance,
+                          fit_dispersive_shift, fit_exponential, fit_flipping,
+                          fit_rabi, fit_ramsey, joint_counts, peak_snr,
+                          population, project_iq, qnd_fidelity, signal_onset)
+from dataset_lib import (create_shot_store, load_cache, save_dataset,
+                         update_cache)
+
+
+def run(routine: Callable[..., Dict[str, Any]],
+        station: Dict[str, Any],
+        **settings: Any) -> Dict[str, Any]:
+    """
+    Call ``routine`` taking its instrument arguments from ``station``.
+
+    Only the station entries whose name matches an argument of the routine are
+    passed, ``settings`` are forwarded unchanged.
+    """
+    parameters = inspect.signature(routine).parameters
+    kwargs = {name: instrument for name, instrument in station.items()
+              if name in parameters}
+    kwargs.update(settings)
+    return routine(**kwargs)
+
+
+def parameter_sweep(parameter: Any, digitizer: Any,
+                    values: Sequence[float]) -> np.ndarray:
+    """Step ``parameter`` through ``values`` and acquire one IQ point each."""
+    data = np.empty(len(values), dtype=complex)
+    for i, value in enumerate(values):
+        parameter(value)
+        data[i] = digitizer.acquire()
+    return data
+
+
+def frequency_sweep(source: Any, digitizer: Any,
+                    freqs: Sequence[float]) -> np.ndarray:
+    """Step ``source.frequency`` through ``freqs`` and acquire one IQ point each."""
+    return parameter_sweep(source.frequency, digitizer, freqs)
+
+
+#--------- resonator characterization
+
+def resonator_punchout(readout: Any,
+                       digitizer: Any,
+                       f_start: float,
+                       f_stop: float,
+                       powers: Sequence[float],
+                       n_coarse: int = 101,
+                       n_fine: int = 31,
+                       fine_span: Optional[float] = None,
+                       name: str = "resonator_punchout") -> Dict[str, Any]:
+    """
+    Resonator punch-out: readout power against frequency.
+
+    The full ``[f_start, f_stop]`` range is only swept with ``n_coarse``
+    points for the first power, and again whenever the resonance is lost.
+    Every other power gets ``n_fine`` points in a window of ``fine_span``
+    around the resonance tracked from the previous power (by default four
+    linewidths of the first fit, at least two coarse steps). The resonance is
+    considered lost, as happens when it jumps to the bare cavity frequency,
+    when its fitted position falls in the outer tenth of the window or its
+    contrast drops below half of the one seen in the last coarse sweep.
+
+    The readout is left on the dispersive readout point: the highest power
+    at which the resonance is still within half a linewidth of its
+    lowest-power frequency, before it punches out.
+
+    Returns:
+        ``powers``, the tracked resonance ``f0`` for each power, the
+        dispersive ``readout_frequency`` and ``readout_power``, the number
+        of acquired points ``n_points`` and ``n_dense``, the number a dense
+        grid with the fine resolution would have needed.
+    """
+    powers = np.asarray(powers, dtype=float)
+    coarse = np.linspace(f_start, f_stop, n_coarse)
+    coarse_step = coarse[1] - coarse[0]
+    f0 = np.full(len(powers), np.nan)
+    all_power, all_freq, all_s21, all_fine = [], [], [], []
+    tracked = None
+    span = fine_span
+
+    def sweep(power, freqs, fine):
+        data = frequency_sweep(readout, digitizer, freqs)
+        all_power.append(np.full(len(freqs), power))
+        all_freq.append(freqs)
+        all_s21.append(data)
+        all_fine.append(np.full(len(freqs), fine))
+        return data
+
+    readout.on()
+    for i, power in enumerate(powers):
+        readout.power(power)
+        for attempt in range(2):
+            if tracked is None:
+                data = sweep(power, coarse, False)
+                tracked, fwhm = find_resonance(coarse, data)
+                depth = np.ptp(np.abs(data))
+                if span is None:
+                    span = max(4 * fwhm, 2 * coarse_step)
+            freqs = np.linspace(tracked - span / 2, tracked + span / 2, n_fine)
+            data = sweep(power, freqs, True)
+            f0[i], _ = find_resonance(freqs, data)
+            lost = (abs(f0[i] - tracked) > 0.4 * span
+                    or np.ptp(np.abs(data)) < depth / 2)
+            tracked = None if lost and attempt == 0 else f0[i]
+            if tracked is not None:
+                break
+
+    order = np.argsort(powers)
+    shifted = np.abs(f0[order] - f0[order[0]]) > fwhm / 2
+    dispersive = order[np.argmax(shifted) - 1] if shifted.any() else order[-1]
+    readout_frequency = float(f0[dispersive])
+    readout_power = float(powers[dispersive])
+    readout.power(readout_power)
+    readout.frequency(readout_frequency)
+
+    n_points = sum(len(chunk) for chunk in all_freq)
+    fine_step = span / (n_fine - 1)
+    n_dense = len(powers) * (int(np.ceil((f_stop - f_start) / fine_step)) + 1)
+    path = save_dataset(name,
+                        {"power": np.concatenate(all_power),
+                         "frequency": np.concatenate(all_freq),
+                         "s21": np.concatenate(all_s21),
+                         "fine": np.concatenate(all_fine),
+                         "f0": f0},
+                        metadata={"f_start": f_start, "f_stop": f_stop,
+                                  "powers": powers, "n_coarse": n_coarse,
+                                  "n_fine": n_fine, "fine_span": span,
+                                  "readout_frequency": readout_frequency,
+                                  "readout_power": readout_power,
+                                  "readout": getattr(readout, "name", None),
+                                  "n_points": n_points, "n_dense": n_dense})
+    return {"powers": powers, "f0": f0, "readout_frequency": readout_frequency,
+            "readout_power": readout_power, "n_points": n_points,
+            "n_dense": n_dense, "dataset": path}
+
+
+def _flux_scan(source: Any,
+               digitizer: Any,
+               flux: Any,
+               biases: Sequence[float],
+               f_start: float,
+               f_stop: float,
+               n_full: int,
+               n_window: int,
+               window: Optional[float],
+               settle_time: float,
+               name: str,
+               metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Frequency against flux bias, shared by the resonator and qubit scans.
+
+    The first row sweeps the full range, the following ones only ``n_window``
+    points in a ``window`` wide span centred on the resonance predicted from
+    the previous rows. The bias of the next row is set (and settles) in a
+    worker thread while the current row is fitted and saved and the source is
+    moved to the start of the next window.
+    """
+    biases = np.asarray(biases, dtype=float)
+    full = np.linspace(f_start, f_stop, n_full)
+    f0 = np.full(len(biases), np.nan)
+    rows = []
+    depth = None
+    previous = None
+    span = window
+
+    def set_bias(value):
+        flux(value)
+        time.sleep(settle_time)
+
+    freqs = full
+    with ThreadPoolExecutor(max_workers=1) as worker:
+        pending = worker.submit(set_bias, biases[0])
+        for i, bias in enumerate(biases):
+            pending.result()
+            data = frequency_sweep(source, digitizer, freqs)
+            if i + 1 < len(biases):
+                pending = worker.submit(set_bias, biases[i + 1])
+            rows.append((np.full(len(freqs), bias), freqs, data))
+
+            found, fwhm = find_resonance(freqs, data)
+            contrast = np.ptp(np.abs(data))
+            lost = (freqs is not full
+                    and (abs(found - freqs.mean()) > 0.4 * span
+                         or contrast < depth / 2))
+            if freqs is full:
+                depth = contrast
+                if span is None:
+                    span = max(6 * fwhm, 2 * (full[1] - full[0]))
+            if lost:
+                freqs = full
+                continue
+            f0[i] = found
+            centre = found
+            if previous is not None and i + 1 < len(biases):
+                slope = (found - previous[1]) / (bias - previous[0])
+                centre += slope * (biases[i + 1] - bias)
+            previous = (bias, found)
+            freqs = np.linspace(centre - span / 2, centre + span / 2, n_window)
+            source.frequency(freqs[0])
+
+    bias, frequency, s21 = (np.concatenate(column) for column in zip(*rows))
+    metadata.update({"biases": biases, "f_start": f_start, "f_stop": f_stop,
+                     "n_full": n_full, "n_window": n_window, "window": span,
+                     "n_points": len(frequency)})
+    path = save_dataset(name, {"bias": bias, "frequency": frequency,
+                               "s21": s21, "f0": f0}, metadata=metadata)
+    return {"biases": biases, "f0": f0, "n_points": len(frequency),
+            "dataset": path}
+
+
+def resonator_flux_dependance(readout: Any,
+                              digitizer: Any,
+                              flux: Any,
+                              biases: Sequence[float],
+                              f_start: float,
+                              f_stop: float,
+                              n_full: int = 101,
+                              n_window: int = 31,
+                              window: Optional[float] = None,
+                              settle_time: float = 0.05,
+                              name: str = "resonator_flux_dependance"
+                              ) -> Dict[str, Any]:
+    """
+    Resonator frequency against flux bias.
+
+    Only the first row (and any row after the resonance is lost) sweeps the
+    full ``[f_start, f_stop]`` range; the others sweep ``n_window`` points in
+    a ``window`` wide span (by default six linewidths of the first fit) around
+    the resonance extrapolated from the previous rows. The next bias is set
+    and left to settle for ``settle_time`` seconds while the current row is
+    being fitted.
+
+    Returns:
+        ``biases`` and the fitted resonance ``f0`` for each of them (NaN
+        where the resonance was lost), the number of acquired points.
+    """
+    readout.on()
+    return _flux_scan(readout, digitizer, flux, biases, f_start, f_stop,
+                      n_full, n_window, window, settle_time, name,
+                      {"readout": getattr(readout, "name", None)})
+
+
+#--------- qubit characterization
+
+def track_resonator(readout: Any,
+                    digitizer: Any,
+                    span: float,
+                    n_points: int = 31,
+                    centre: Optional[float] = None) -> float:
+    """
+    Re-centre the readout tone on the resonator.
+
+    Sweeps ``n_points`` in ``span`` around ``centre`` (the current readout
+    frequency by default), leaves ``readout`` on the fitted resonance and
+    returns it.
+    """
+    if centre is None:
+        centre = readout.frequency()
+    freqs = np.linspace(centre - span / 2, centre + span / 2, n_points)
+    f0, _ = find_resonance(freqs, frequency_sweep(readout, digitizer, freqs))
+    readout.frequency(f0)
+    return f0
+
+
+def qubit_spectroscopy(readout: Any,
+                       drive: Any,
+                       digitizer: Any,
+                       f_start: float,
+                       f_stop: float,
+                       device: str = "QB_1",
+                       n_coarse: int = 401,
+                       n_points: int = 51,
+                       zoom: float = 5.0,
+                       resolution: float = 4.0,
+                       snr_threshold: float = 5.0,
+                       readout_frequency: Optional[float] = None,
+                       readout_power: Optional[float] = None,
+                       readout_span: Optional[float] = 2e6,
+                       drive_power: Optional[float] = None,
+                       name: str = "qubit_spectroscopy") -> Dict[str, Any]:
+    """
+    Two-tone qubit spectroscopy with a shrinking search window.
+
+    The readout tone is set to ``readout_frequency`` and ``readout_power``
+    (the dispersive point of :func:`resonator_punchout`; by default the
+    current power and the cached readout frequency), then re-centred on the
+    resonator with :func:`track_resonator` (skipped if ``readout_span`` is
+    None). The drive then sweeps the qubit window by window: the search
+    starts from the whole ``[f_start, f_stop]`` range with ``n_coarse``
+    points or, when ``device`` was measured before, directly from
+    ``n_points`` one zoom level around its cached qubit frequency. After each
+    window the span shrinks by ``zoom`` around the detected peak, until the frequency step is
+    below ``1 / resolution`` of the linewidth. If the peak is not detected
+    (its SNR is below ``snr_threshold``) in a narrow window, the search
+    restarts from the whole range.
+
+    When a peak is found the drive is left on ``qubit_frequency``.
+
+    Returns:
+        ``qubit_frequency`` and ``fwhm`` (NaN if no peak was found),
+        ``readout_frequency`` and the number of acquired points.
+    """
+    key = f"{device}/qubit_spectroscopy"
+    cached = load_cache(key, {})
+    if readout_power is not None:
+        readout.power(readout_power)
+    if readout_frequency is None:
+        readout_frequency = cached.get("readout_frequency")
+    if readout_frequency is not None:
+        readout.frequency(readout_frequency)
+    readout.on()
+    if readout_span:
+        drive.off()
+        track_resonator(readout, digitizer, readout_span)
+    readout_frequency = readout.frequency()
+    if drive_power is not None:
+        drive.power(drive_power)
+    drive.on()
+
+    full_span = f_stop - f_start
+    if "qubit_frequency" in cached:
+        centre, span = cached["qubit_frequency"], min(cached["span"] * zoom,
+                                                      full_span)
+    else:
+        centre, span = (f_start + f_stop) / 2, full_span
+    windows, all_freq, all_s21 = [], [], []
+    f_qubit, fwhm = np.nan, np.nan
+    for window in range(20):
+        low = max(centre - span / 2, f_start)
+        freqs = np.linspace(low, min(low + span, f_stop),
+                            n_coarse if span >= full_span else n_points)
+        data = frequency_sweep(drive, digitizer, freqs)
+        windows.append(np.full(len(freqs), window))
+        all_freq.append(freqs)
+        all_s21.append(data)
+        if peak_snr(data) < snr_threshold:
+            if span >= full_span:
+                f_qubit, fwhm = np.nan, np.nan
+                break
+            centre, span = (f_start + f_stop) / 2, full_span
+            continue
+        f_qubit, fwhm = find_resonance(freqs, data)
+        if freqs[1] - freqs[0] <= fwhm / resolution or span <= 8 * fwhm:
+            break
+        centre, span = f_qubit, max(span / zoom, 8 * fwhm)
+
+    if np.isfinite(f_qubit):
+        # leave the drive on the line for the routines that follow
+        drive.frequency(f_qubit)
+        update_cache(key, {"qubit_frequency": f_qubit, "fwhm": fwhm,
+                           "span": span, "readout_frequency": readout_frequency})
+    frequency = np.concatenate(all_freq)
+    path = save_dataset(name,
+                        {"window": np.concatenate(windows),
+                         "frequency": frequency,
+                         "s21": np.concatenate(all_s21)},
+                        metadata={"device": device, "f_start": f_start,
+                                  "f_stop": f_stop, "n_coarse": n_coarse,
+                                  "n_points": n_points,
+                                  "qubit_frequency": f_qubit, "fwhm": fwhm,
+                                  "readout_frequency": readout_frequency,
+                                  "readout": getattr(readout, "name", None),
+                                  "drive": getattr(drive, "name", None)})
+    return {"qubit_frequency": f_qubit, "fwhm": fwhm,
+            "readout_frequency": readout_frequency,
+            "n_points": len(frequency), "dataset": path}
+
+
+def qubit_flux_dependance(readout: Any,
+                          drive: Any,
+                          digitizer: Any,
+                          flux: Any,
+                          biases: Sequence[float],
+                          f_start: float,
+                          f_stop: float,
+                          readout_frequency: Optional[float] = None,
+                          n_full: int = 201,
+                          n_window: int = 41,
+                          window: Optional[float] = None,
+                          settle_time: float = 0.05,
+                          name: str = "qubit_flux_dependance"
+                          ) -> Dict[str, Any]:
+    """
+    Two-tone qubit frequency against flux bias.
+
+    The readout tone stays at ``readout_frequency`` (its current frequency by
+    default) while ``drive`` sweeps the qubit; rows are narrowed and the bias
+    pipelined as in :func:`resonator_flux_dependance`.
+    """
+    if readout_frequency is not None:
+        readout.frequency(readout_frequency)
+    readout.on()
+    drive.on()
+    return _flux_scan(drive, digitizer, flux, biases, f_start, f_stop,
+                      n_full, n_window, window, settle_time, name,
+                      {"readout": getattr(readout, "name", None),
+                       "drive": getattr(drive, "name", None),
+                       "readout_frequency": readout.frequency()})
+
+
+#--------- low level characterization single qubit
+
+def rabi_oscillation(readout: Any,
+                     drive: Any,
+                     digitizer: Any,
+                     values: Sequence[float],
+                     mode: str = "amplitude",
+                     reference_power: float = 0.0,
+                     pulse_width: Optional[float] = None,
+                     pulse_period: Optional[float] = None,
+                     pulse_delay: Optional[float] = None,
+                     repetitions: int = 1,
+                     drive_frequency: Optional[float] = None,
+                     name: str = "rabi_oscillation") -> Dict[str, Any]:
+    """
+    Amplitude or duration Rabi oscillation on the pulse-modulated drive.
+
+    With ``mode="amplitude"`` the drive amplitude is swept through ``values``,
+    relative to the amplitude at ``reference_power`` (``drive.power`` is set
+    to ``reference_power + 20 log10(value)``). With ``mode="duration"`` the
+    ``values`` are pulse widths, in the units of ``drive.pulse_width``. The
+    PULM ``pulse_width``, ``pulse_period`` and ``pulse_delay`` and the
+    ``drive_frequency`` (the qubit frequency) are applied first when given.
+
+    The sweep is repeated ``repetitions`` times and all repetitions are fitted
+    in one call of :func:`analysis_lib.fit_rabi`.
+
+    The drive is left playing π pulses: at ``pi_power`` in the amplitude
+    mode, with a ``pulse_width`` of ``x_pi`` in the duration mode.
+
+    Returns:
+        ``x_pi`` (the π amplitude or width) averaged over the repetitions with
+        its standard deviation ``x_pi_std``, the ``rabi_frequency`` and, for
+        the amplitude mode, the corresponding ``pi_power`` in dBm.
+    """
+    values = np.asarray(values, dtype=float)
+    if mode == "amplitude":
+        if np.any(values <= 0):
+            raise ValueError("Rabi amplitudes must be positive")
+        parameter = drive.power
+        setpoints = reference_power + 20 * np.log10(values)
+    elif mode == "duration":
+        parameter = drive.pulse_width
+        setpoints = values
+    else:
+        raise ValueError(f"Unknown Rabi mode {mode!r}, use 'amplitude' or 'duration'")
+    if pulse_width is not None:
+        drive.pulse_width(pulse_width)
+    if pulse_period is not None:
+        drive.pulse_period(pulse_period)
+    if pulse_delay is not None:
+        drive.pulse_delay(pulse_delay)
+    if drive_frequency is not None:
+        drive.frequency(drive_frequency)
+    drive.pulsemod_state('on')
+    drive.on()
+    readout.on()
+
+    data = np.array([parameter_sweep(parameter, digitizer, setpoints)
+                     for _ in range(repetitions)])
+    fit = fit_rabi(values, data)
+    x_pi = float(np.mean(fit["x_pi"]))
+    result = {"mode": mode, "x_pi": x_pi, "x_pi_std": float(np.std(fit["x_pi"])),
+              "rabi_frequency": float(np.mean(fit["frequency"]))}
+    if mode == "amplitude":
+        result["pi_power"] = float(reference_power + 20 * np.log10(x_pi))
+    setpoint = result["pi_power"] if mode == "amplitude" else x_pi
+    if np.isfinite(setpoint):
+        parameter(setpoint)
+    result["dataset"] = save_dataset(
+        name, {"values": values, "setpoints": setpoints, "s21": data,
+               "x_pi": fit["x_pi"], "frequency": fit["frequency"]},
+        metadata=dict(result, reference_power=reference_power,
+                      repetitions=repetitions,
+                      readout=getattr(readout, "name", None),
+                      drive=getattr(drive, "name", None)))
+    return result
+
+
+def _coarse_to_fine(n: int) -> np.ndarray:
+    """Indices ``0..n-1`` in bit-reversed order: every prefix spans the range."""
+    bits = max(int(np.ceil(np.log2(n))), 1)
+    reversed_bits = [int(format(i, f"0{bits}b")[::-1], 2) for i in range(2 ** bits)]
+    inner = [i for i in reversed_bits if 0 < i < n - 1]
+    return np.array([0, n - 1] + inner if n > 1 else [0])
+
+
+def coherence_time(readout: Any,
+                   drive: Any,
+                   digitizer: Any,
+                   t_min: float,
+                   t_max: float,
+                   experiment: str = "T1",
+                   n_points: int = 41,
+                   set_delay: Optional[Callable[[float], None]] = None,
+                   rel_tol: float = 0.05,
+                   min_points: int = 8,
+                   refit_every: int = 2,
+                   qubit_frequency: Optional[float] = None,
+                   pi_power: Optional[float] = None,
+                   name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    T1 or T2 echo decay on a logarithmic delay grid with early stopping.
+
+    The ``n_points`` delays are log-spaced between ``t_min`` and ``t_max`` and
+    measured in bit-reversed order, so that the points taken so far always
+    cover the whole range. From ``min_points`` on, the decay is refitted
+    every ``refit_every`` points and the measurement stops as soon as the 95%
+    confidence interval of the decay time is within ``rel_tol`` of it.
+
+    ``set_delay(tau)`` programs the free-evolution delay. For T1 it defaults
+    to ``readout.pulse_delay``, the π pulse being played by ``drive`` at the
+    trigger; the echo sequence of ``experiment="T2echo"`` has to be
+    programmed by a ``set_delay`` callable. The drive is set to
+    ``qubit_frequency`` and ``pi_power`` (see :func:`rabi_oscillation`) when
+    they are given.
+
+    Returns:
+        ``tau`` and its standard error ``tau_err``, the number of measured
+        delays ``n_measured`` and ``stopped_early``.
+    """
+    if experiment not in ("T1", "T2echo"):
+        raise ValueError(f"Unknown experiment {experiment!r}, use 'T1' or 'T2echo'")
+    if set_delay is None:
+        if experiment != "T1":
+            raise ValueError("T2 echo needs a set_delay callable that programs "
+                             "the pi/2 - pi - pi/2 sequence")
+        set_delay = readout.pulse_delay
+    delays = np.geomspace(t_min, t_max, n_points)
+    data = np.full(n_points, np.nan, dtype=complex)
+    measured = np.zeros(n_points, dtype=bool)
+    if qubit_frequency is not None:
+        drive.frequency(qubit_frequency)
+    if pi_power is not None:
+        drive.power(pi_power)
+    drive.pulsemod_state('on')
+    drive.on()
+    readout.on()
+
+    stopped_early = False
+    for count, i in enumerate(_coarse_to_fine(n_points), start=1):
+        set_delay(delays[i])
+        data[i] = digitizer.acquire()
+        measured[i] = True
+        if count < min_points or (count - min_points) % refit_every:
+            continue
+        fit = fit_exponential(delays[measured], data[measured])
+        if 1.96 * fit["tau_err"] < rel_tol * fit["tau"]:
+            stopped_early = count < n_points
+            break
+    fit = fit_exponential(delays[measured], data[measured])
+
+    result = {"experiment": experiment, "tau": float(fit["tau"]),
+              "tau_err": float(fit["tau_err"]),
+              "n_measured": int(measured.sum()), "stopped_early": stopped_early}
+    result["dataset"] = save_dataset(
+        name or experiment, {"delay": delays[measured], "s21": data[measured]},
+        metadata=dict(result, t_min=t_min, t_max=t_max, n_points=n_points,
+                      rel_tol=rel_tol, readout=getattr(readout, "name", None),
+                      drive=getattr(drive, "name", None)))
+    return result
+
+
+def ramsey(readout: Any,
+           drive: Any,
+           digitizer: Any,
+           delays: Sequence[float],
+           detuning: float = 0.0,
+           qubit_frequency: Optional[float] = None,
+           detune_with: str = "frequency",
+           set_delay: Optional[Callable[[float], None]] = None,
+           repetitions: int = 1,
+           pi_power: Optional[float] = None,
+           name: str = "ramsey") -> Dict[str, Any]:
+    """
+    Ramsey experiment with the two π/2 pulses of the PULM double-pulse mode.
+
+    The drive is expected to be configured with π/2 pulses (``pulse_width``
+    and ``double_pulse_width``); given the ``pi_power`` of
+    :func:`rabi_oscillation`, the drive power is set 6 dB below it (half the
+    π amplitude). ``delays`` (uniform, in seconds) are the
+    start-to-start delays of the two pulses, set with
+    ``drive.pulse_double_delay`` unless a ``set_delay`` callable is given.
+
+    The ``detuning`` (Hz) from ``qubit_frequency`` (the current drive
+    frequency by default) is applied either by offsetting ``drive.frequency``
+    (``detune_with="frequency"``) or, keeping the drive on resonance, by
+    advancing ``drive.phase_var`` by ``360 * detuning * delay`` degrees at
+    each point (``detune_with="phase"``).
+
+    The ``repetitions`` are fitted together with
+    :func:`analysis_lib.fit_ramsey`, giving one frequency per repetition to
+    track drifts.
+
+    Returns:
+        ``t2_star``, the oscillation ``frequency`` (mean over repetitions)
+        and its ``drift`` per repetition, and ``qubit_frequency``, corrected
+        by ``detuning - frequency`` when detuned.
+    """
+    delays = np.asarray(delays, dtype=float)
+    if qubit_frequency is None:
+        qubit_frequency = drive.frequency()
+    if set_delay is None:
+        set_delay = drive.pulse_double_delay
+    if detune_with == "frequency":
+        drive.frequency(qubit_frequency + detuning)
+        setter = set_delay
+    elif detune_with == "phase":
+        drive.frequency(qubit_frequency)
+
+        def setter(delay):
+            set_delay(delay)
+            drive.phase_var((360 * detuning * delay) % 360)
+    else:
+        raise ValueError(f"Unknown detuning method {detune_with!r}, "
+                         "use 'frequency' or 'phase'")
+    if pi_power is not None:
+        drive.power(pi_power - 20 * np.log10(2))
+    drive.pulse_modulation_mode('DOUB')
+    drive.pulsemod_state('on')
+    drive.on()
+    readout.on()
+
+    data = np.array([parameter_sweep(setter, digitizer, delays)
+                     for _ in range(repetitions)])
+    fit = fit_ramsey(delays, data)
+    frequency = float(np.mean(fit["frequency"]))
+    result = {"t2_star": float(np.mean(fit["t2"])),
+              "t2_star_err": float(np.sqrt(np.sum(fit["t2_err"] ** 2))
+                                   / repetitions),
+              "frequency": frequency,
+              "drift": fit["frequency"] - fit["frequency"][0],
+              "detuning": detuning}
+    result["qubit_frequency"] = (qubit_frequency + detuning - frequency
+                                 if detuning else qubit_frequency)
+    result["dataset"] = save_dataset(
+        name, {"delay": delays, "s21": data, "frequency": fit["frequency"],
+               "t2": fit["t2"]},
+        metadata=dict(result, detune_with=detune_with,
+                      drive_frequency=qubit_frequency,
+                      readout=getattr(readout, "name", None),
+                      drive=getattr(drive, "name", None)))
+    return result
+
+
+def ramsey_detuned(readout: Any,
+                   drive: Any,
+                   digitizer: Any,
+                   delays: Sequence[float],
+                   detuning: float,
+                   qubit_frequency: Optional[float] = None,
+                   detune_with: str = "frequency",
+                   set_delay: Optional[Callable[[float], None]] = None,
+                   repetitions: int = 1,
+                   pi_power: Optional[float] = None,
+                   name: str = "ramsey_detuned") -> Dict[str, Any]:
+    """Detuned Ramsey: :func:`ramsey` with a mandatory ``detuning``."""
+    return ramsey(readout, drive, digitizer, delays, detuning=detuning,
+                  qubit_frequency=qubit_frequency, detune_with=detune_with,
+                  set_delay=set_delay, repetitions=repetitions,
+                  pi_power=pi_power, name=name)
+
+
+#--------- gate set
+
+def std_randomized_benchmarking(readout: Any,
+                                digitizer: Any,
+                                sequencer: Any,
+                                lengths: Sequence[int],
+                                n_sequences: int = 30,
+                                seed: int = 0,
+                                name: str = "std_randomized_benchmarking"
+                                ) -> Dict[str, Any]:
+    """
+    Single-qubit standard randomized benchmarking.
+
+    The compiled sequences of every length are loaded from the
+    :func:`RB_lib.load_sequences` cache (or generated once) before the first
+    acquisition, so only ``sequencer.load`` and the readout remain in the
+    measurement loop. The signal averaged over the sequences of each length
+    is fitted with ``A p^m + B``.
+
+    Returns:
+        The depolarizing parameter ``p``, the average error per Clifford
+        ``error_per_clifford`` (``(1 - p) / 2``) and per physical pulse
+        ``error_per_pulse``.
+    """
+    lengths = np.asarray(lengths, dtype=int)
+    sequences = [RB_lib.load_sequences(int(length), n_sequences, seed + int(length))
+                 for length in lengths]
+    readout.on()
+    data = np.empty((len(lengths), n_sequences), dtype=complex)
+    for i, compiled in enumerate(sequences):
+        for j in range(n_sequences):
+            sequencer.load(RB_lib.sequence_pulses(compiled, j))
+            data[i, j] = digitizer.acquire()
+
+    signal = project_iq(data.ravel()).reshape(data.shape).mean(axis=1)
+    fit = fit_exponential(lengths, signal)
+    p = float(np.exp(-1 / fit["tau"]))
+    p_err = float(p * fit["tau_err"] / fit["tau"] ** 2)
+    error = (1 - p) / 2
+    result = {"p": p, "p_err": p_err, "error_per_clifford": error,
+              "error_per_pulse": float(error / RB_lib.PULSE_COUNT.mean())}
+    result["dataset"] = save_dataset(
+        name, {"length": lengths, "s21": data, "signal": signal},
+        metadata=dict(result, n_sequences=n_sequences, seed=seed,
+                      readout=getattr(readout, "name", None)))
+    return result
+
+
+ALLXY_PULSES = {"I": "I", "X": "X180", "Y": "Y180", "x": "X90", "y": "Y90"}
+ALLXY_PAIRS = ("II", "XX", "YY", "XY", "YX", "xI", "yI", "xy", "yx", "xY", "yX",
+               "Xy", "Yx", "xX", "Xx", "yY", "Yy", "XI", "YI", "xx", "yy")
+ALLXY_IDEAL = np.array([0.0] * 5 + [0.5] * 12 + [1.0] * 4)
+
+
+def sequence_sweep(sequencer: Any, digitizer: Any,
+                   sequences: Sequence[Sequence[str]]) -> np.ndarray:
+    """Load each pulse sequence and acquire one IQ point."""
+    data = np.empty(len(sequences), dtype=complex)
+    for i, pulses in enumerate(sequences):
+        sequencer.load(pulses)
+        data[i] = digitizer.acquire()
+    return data
+
+
+def allxy(readout: Any,
+          digitizer: Any,
+          sequencer: Any,
+          repetitions: int = 1,
+          name: str = "allxy") -> Dict[str, Any]:
+    """
+    AllXY: the 21 pairs of ``I``, ``X180``, ``Y180``, ``X90``, ``Y90`` pulses.
+
+    Populations are normalised to the mean of the pairs ideally left in the
+    ground state (first five) and in the excited state (last four).
+
+    Returns:
+        The ``population`` of each pair (in the order of
+        :data:`ALLXY_PAIRS`) averaged over the repetitions, and the
+        root-mean-square ``deviation`` from the ideal staircase.
+    """
+    readout.on()
+    sequences = [[ALLXY_PULSES[p] for p in pair] for pair in ALLXY_PAIRS]
+    data = np.array([sequence_sweep(sequencer, digitizer, sequences)
+                     for _ in range(repetitions)]).mean(axis=0)
+    pop = population(data, data[ALLXY_IDEAL == 0].mean(),
+                     data[ALLXY_IDEAL == 1].mean())
+    result = {"population": pop,
+              "deviation": float(np.sqrt(np.mean((pop - ALLXY_IDEAL) ** 2)))}
+    result["dataset"] = save_dataset(
+        name, {"s21": data, "population": pop},
+        metadata=dict(result, pairs=ALLXY_PAIRS, repetitions=repetitions,
+                      readout=getattr(readout, "name", None)))
+    return result
+
+
+def drag_calibration(readout: Any,
+                     digitizer: Any,
+                     sequencer: Any,
+                     drags: Sequence[float],
+                     name: str = "drag_calibration") -> Dict[str, Any]:
+    """
+    DRAG coefficient from the ``X90-Y180`` and ``Y90-X180`` pairs.
+
+    Both pairs ideally end on the equator; a phase error moves them in
+    opposite directions, linearly with the DRAG coefficient. ``sequencer``
+    must accept ``set_pulse_parameters(drag=...)``, as the
+    :class:`pulse_lib.PulseCompiler`. The best coefficient, where the two
+    signals cross, is left set on the sequencer.
+
+    Returns:
+        ``drag`` at the crossing.
+    """
+    drags = np.asarray(drags, dtype=float)
+    readout.on()
+    data = np.empty((len(drags), 2), dtype=complex)
+    for i, drag in enumerate(drags):
+        sequencer.set_pulse_parameters(drag=drag)
+        data[i] = sequence_sweep(sequencer, digitizer,
+                                 [["X90", "Y180"], ["Y90", "X180"]])
+    signal = project_iq(data.ravel()).reshape(data.shape)
+    slope, intercept = np.polyfit(drags, signal[:, 0] - signal[:, 1], 1)
+    best = float(-intercept / slope)
+    sequencer.set_pulse_parameters(drag=best)
+    result = {"drag": best}
+    result["dataset"] = save_dataset(
+        name, {"drag": drags, "s21": data},
+        metadata=dict(result, readout=getattr(readout, "name", None)))
+    return result
+
+
+def allxy_drag_training(readout: Any,
+                        digitizer: Any,
+                        sequencer: Any,
+                        drags: Optional[Sequence[float]] = None,
+                        repetitions: int = 1,
+                        name: str = "allxy_drag_training") -> Dict[str, Any]:
+    """
+    :func:`drag_calibration` over ``drags`` (if given), then :func:`allxy`
+    with the resulting pulses.
+    """
+    result = {}
+    if drags is not None:
+        result.update(drag_calibration(readout, digitizer, sequencer, drags,
+                                       name=f"{name}_drag"))
+    result.update(allxy(readout, digitizer, sequencer, repetitions=repetitions,
+                        name=name))
+    return result
+
+
+def flipping(readout: Any,
+             digitizer: Any,
+             sequencer: Any,
+             n_max: int = 30,
+             name: str = "flipping") -> Dict[str, Any]:
+    """
+    Flipping: ``X90`` followed by an even number ``n <= n_max`` of ``X180``.
+
+    The populations, normalised with an ``I`` and an ``X180`` reference, are
+    fitted with :func:`analysis_lib.fit_flipping`. When ``sequencer`` has
+    pulse ``parameters`` (a :class:`pulse_lib.PulseCompiler`), the corrected
+    π amplitude is returned but not applied.
+
+    Returns:
+        The relative π rotation error ``eps`` and ``eps_err``, and
+        ``pi_amplitude`` corrected by ``1 / (1 + eps)`` when available.
+    """
+    n = np.arange(0, n_max + 1, 2)
+    readout.on()
+    sequences = [["I"], ["X180"]] + [["X90"] + ["X180"] * k for k in n]
+    data = sequence_sweep(sequencer, digitizer, sequences)
+    pop = population(data[2:], data[0], data[1])
+    eps, eps_err = fit_flipping(n, pop)
+    result = {"eps": eps, "eps_err": eps_err}
+    parameters = getattr(sequencer, "parameters", None)
+    if parameters is not None:
+        result["pi_amplitude"] = parameters["pi_amplitude"] / (1 + eps)
+    result["dataset"] = save_dataset(
+        name, {"n": n, "s21": data[2:], "references": data[:2],
+               "population": pop},
+        metadata=dict(result, readout=getattr(readout, "name", None)))
+    return result
+
+
+#--------- readout characterization
+
+PREPARATION_PULSES = (["I"], ["X180"])
+
+
+def _stream_shots(digitizer: Any, sequencer: Any, n_shots: int,
+                  batch_size: int,
+                  classifier: Optional[ShotClassifier] = None) -> np.ndarray:
+    """
+    ``(2, n_shots)`` single shots after preparing the ground and excited
+    states, acquired in alternating batches and fed to ``classifier`` as they
+    arrive.
+    """
+    shots = np.empty((len(PREPARATION_PULSES), n_shots), dtype=np.complex64)
+    for start in range(0, n_shots, batch_size):
+        stop = min(start + batch_size, n_shots)
+        for state, pulses in enumerate(PREPARATION_PULSES):
+            sequencer.load(pulses)
+            shots[state, start:stop] = digitizer.acquire_shots(stop - start)
+            if classifier is not None:
+                classifier.partial_fit(shots[state, start:stop], state)
+    return shots
+
+
+def single_shot_classification(readout: Any,
+                               digitizer: Any,
+                               sequencer: Any,
+                               n_shots: int = 100000,
+                               batch_size: int = 10000,
+                               device: str = "QB_1",
+                               name: str = "single_shot_classification"
+                               ) -> Dict[str, Any]:
+    """
+    Train the single-shot discriminator of ``device``.
+
+    Ground and excited state shots are streamed in batches of ``batch_size``
+    into a :class:`analysis_lib.ShotClassifier`, whose statistics are then
+    cached for :func:`readout_fidelity`.
+
+    Returns:
+        The ``assignment_matrix`` (``P(assigned j | prepared i)``) of the
+        training shots, the assignment ``fidelity`` and the state ``means``.
+    """
+    readout.on()
+    classifier = ShotClassifier()
+    shots = _stream_shots(digitizer, sequencer, n_shots, batch_size, classifier)
+    labels = np.repeat(np.arange(len(PREPARATION_PULSES), dtype=np.int8), n_shots)
+    matrix = classifier.assignment_matrix(shots, labels)
+    update_cache(f"{device}/discriminator", classifier.to_dict())
+    result = {"assignment_matrix": matrix,
+              "fidelity": assignment_fidelity(matrix),
+              "means": classifier.means}
+    result["dataset"] = save_dataset(
+        name, {"shots": shots},
+        metadata=dict(result, device=device, n_shots=n_shots,
+                      readout=getattr(readout, "name", None)))
+    return result
+
+
+def _load_classifier(device: str) -> ShotClassifier:
+    state = load_cache(f"{device}/discriminator")
+    if state is None:
+        raise RuntimeError(f"No discriminator for {device}, "
+                           "run the single shot classification first")
+    return ShotClassifier.from_dict(state)
+
+
+def readout_fidelity(readout: Any,
+                     digitizer: Any,
+                     sequencer: Any,
+                     n_shots: int = 100000,
+                     batch_size: int = 10000,
+                     device: str = "QB_1",
+                     name: str = "readout_fidelity") -> Dict[str, Any]:
+    """
+    Assignment matrix and fidelity with the cached discriminator of
+    ``device`` (see :func:`single_shot_classification`), on fresh shots.
+    """
+    classifier = _load_classifier(device)
+    readout.on()
+    shots = _stream_shots(digitizer, sequencer, n_shots, batch_size)
+    labels = np.repeat(np.arange(len(PREPARATION_PULSES), dtype=np.int8), n_shots)
+    matrix = classifier.assignment_matrix(shots, labels)
+    result = {"assignment_matrix": matrix,
+              "fidelity": assignment_fidelity(matrix)}
+    result["dataset"] = save_dataset(
+        name, {"shots": shots},
+        metadata=dict(result, device=device, n_shots=n_shots,
+                      readout=getattr(readout, "name", None)))
+    return result
+
+
+def qndness(readout: Any,
+            digitizer: Any,
+            sequencer: Any,
+            n_shots: int = 1000000,
+            batch_size: int = 100000,
+            device: str = "QB_1",
+            name: str = "qndness") -> Dict[str, Any]:
+    """
+    Quantum non-demolition fidelity of the readout of ``device``.
+
+    Each shot prepares the ground or excited state and reads it out twice
+    back to back (``digitizer.acquire_repeated_shots``). Batches of
+    ``batch_size`` shots are classified with the cached discriminator,
+    written to the shot store and added to the contingency table of the two
+    outcomes, so the analysis is a single pass over the shots and only one
+    batch is in memory at a time.
+
+    Returns:
+        ``counts[k, i, j]``, the number of shots prepared in ``k`` and
+        assigned ``i`` then ``j``; the QND ``fidelity`` pooled over both
+        preparations; the ``repeatability`` of each prepared state ``k``,
+        ``P(second = k | first = k)``; and the path of the ``shots`` file,
+        with the outcomes indexed like ``counts``.
+    """
+    classifier = _load_classifier(device)
+    n_states = len(PREPARATION_PULSES)
+    counts = np.zeros((n_states, 2, 2), dtype=np.int64)
+    store = create_shot_store(name, (n_states, 2, n_shots),
+                              metadata={"device": device})
+    readout.on()
+    for start in range(0, n_shots, batch_size):
+        stop = min(start + batch_size, n_shots)
+        for state, pulses in enumerate(PREPARATION_PULSES):
+            sequencer.load(pulses)
+            outcomes = classifier.predict(
+                digitizer.acquire_repeated_shots(stop - start, 2))
+            store[state, :, start:stop] = outcomes
+            joint_counts(outcomes[0], outcomes[1], counts=counts[state])
+    store.flush()
+
+    result = {"counts": counts, "fidelity": qnd_fidelity(counts.sum(axis=0)),
+              "repeatability": [float(c[k, k] / max(c[k].sum(), 1))
+                                for k, c in enumerate(counts)],
+              "shots": store.filename}
+    del store
+    result["dataset"] = save_dataset(
+        name, {"counts": counts},
+        metadata=dict(result, device=device, n_shots=n_shots,
+                      readout=getattr(readout, "name", None)))
+    return result
+
+
+def fast_reset_test(readout: Any,
+                    digitizer: Any,
+                    sequencer: Any,
+                    delays: Sequence[float],
+                    set_delay: Optional[Callable[[float], None]] = None,
+                    n_shots: int = 100000,
+                    batch_size: int = 10000,
+                    n_bins: int = 100,
+                    target: float = 0.01,
+                    device: str = "QB_1",
+                    name: str = "fast_rst_test") -> Dict[str, Any]:
+    """
+    Residual excited population after the active reset, against the delay.
+
+    For each delay the qubit is prepared in the excited state, reset, and
+    read out after ``set_delay(delay)`` (``readout.pulse_delay`` by default).
+    The discriminator scores of the ``n_shots`` shots, streamed in batches,
+    are written to a preallocated buffer and counted in place into a
+    ``(len(delays), n_bins)`` histogram with ``np.add.at``; the shots
+    themselves are not kept. The bins are symmetric around the decision
+    boundary, so the excited population is the sum of the upper half of each
+    histogram.
+
+    Returns:
+        ``delays``, the excited ``population`` at each of them and
+        ``reset_time``, the first delay with a population below ``target``
+        (NaN if none).
+    """
+    if set_delay is None:
+        set_delay = readout.pulse_delay
+    if n_bins % 2:
+        raise ValueError("n_bins must be even")
+    classifier = _load_classifier(device)
+    delays = np.asarray(delays, dtype=float)
+    half_range = 2 * np.abs(classifier.decision(classifier.means)).max()
+    scale = n_bins / (2 * half_range)
+    histograms = np.zeros((len(delays), n_bins), dtype=np.int64)
+    bins = np.empty(batch_size, dtype=np.intp)
+    scores = np.empty(batch_size, dtype=np.float64)
+    readout.on()
+    sequencer.load(PREPARATION_PULSES[1])
+    for i, delay in enumerate(delays):
+        set_delay(delay)
+        for start in range(0, n_shots, batch_size):
+            n = min(batch_size, n_shots - start)
+            classifier.decision(digitizer.acquire_shots(n), out=scores[:n])
+            scores[:n] += half_range
+            scores[:n] *= scale
+            np.clip(scores[:n], 0, n_bins - 1, out=scores[:n])
+            bins[:n] = scores[:n]
+            np.add.at(histograms[i], bins[:n], 1)
+
+    population = histograms[:, n_bins // 2:].sum(axis=1) / n_shots
+    below = np.flatnonzero(population <= target)
+    result = {"delays": delays, "population": population,
+              "reset_time": float(delays[below[0]]) if len(below) else np.nan}
+    edges = np.linspace(-half_range, half_range, n_bins + 1)
+    result["dataset"] = save_dataset(
+        name, {"delays": delays, "histograms": histograms, "edges": edges,
+               "population": population},
+        metadata=dict(result, device=device, n_shots=n_shots, target=target,
+                      readout=getattr(readout, "name", None)))
+    return result
+
+
+def readout_fr_optimization(readout: Any,
+                            digitizer: Any,
+                            sequencer: Any,
+                            f_min: float,
+                            f_max: float,
+                            p_min: float,
+                            p_max: float,
+                            n_evaluations: int = 25,
+                            n_initial: int = 6,
+                            n_shots: int = 5000,
+                            device: str = "QB_1",
+                            seed: int = 0,
+                            name: str = "readout_fr_optimization"
+                            ) -> Dict[str, Any]:
+    """
+    Readout frequency and power maximising the assignment fidelity.
+
+    Bayesian optimisation: after ``n_initial`` Latin-hypercube points, each
+    new (``frequency``, ``power``) point maximises the
+    :func:`analysis_lib.expected_improvement` of a Gaussian process fitted to
+    the points evaluated so far, up to ``n_evaluations`` points in total.
+    A point is evaluated by training a discriminator on ``n_shots`` shots of
+    each state.
+
+    Every evaluation is stored in the cache of ``device`` as soon as it is
+    done; a run with the same bounds resumes from the cached points. The
+    readout is left on the best point, which is also cached as the readout
+    point of ``device``.
+
+    Returns:
+        The best ``frequency``, ``power`` and ``fidelity`` and the number of
+        points measured in this run, ``n_measured``.
+    """
+    key = f"{device}/readout_optimization"
+    bounds = [[f_min, f_max], [p_min, p_max]]
+    cached = load_cache(key, {})
+    points = cached.get("points", []) if cached.get("bounds") == bounds else []
+    low, width = np.array([f_min, p_min]), np.array([f_max - f_min, p_max - p_min])
+    rng = np.random.default_rng(seed)
+    initial = (np.column_stack([rng.permutation(n_initial) for _ in range(2)])
+               + rng.random((n_initial, 2))) / n_initial
+    readout.on()
+
+    n_measured = 0
+    while len(points) < n_evaluations:
+        if len(points) < n_initial:
+            unit = initial[len(points)]
+        else:
+            evaluated = np.array(points)
+            candidates = rng.random((2000, 2))
+            score = expected_improvement((evaluated[:, :2] - low) / width,
+                                         evaluated[:, 2], candidates)
+            unit = candidates[np.argmax(score)]
+        frequency, power = low + unit * width
+        readout.frequency(frequency)
+        readout.power(power)
+        classifier = ShotClassifier()
+        shots = _stream_shots(digitizer, sequencer, n_shots, n_shots, classifier)
+        labels = np.repeat(np.arange(len(PREPARATION_PULSES), dtype=np.int8),
+                           n_shots)
+        fidelity = assignment_fidelity(classifier.assignment_matrix(shots, labels))
+        points.append([float(frequency), float(power), fidelity])
+        update_cache(key, {"bounds": bounds, "points": points})
+        n_measured += 1
+
+    evaluated = np.array(points)
+    best = evaluated[np.argmax(evaluated[:, 2])]
+    readout.frequency(best[0])
+    readout.power(best[1])
+    update_cache(f"{device}/readout_point",
+                 {"frequency": best[0], "power": best[1], "fidelity": best[2]})
+    result = {"frequency": float(best[0]), "power": float(best[1]),
+              "fidelity": float(best[2]), "n_measured": n_measured}
+    result["dataset"] = save_dataset(
+        name, {"frequency": evaluated[:, 0], "power": evaluated[:, 1],
+               "fidelity": evaluated[:, 2]},
+        metadata=dict(result, device=device, bounds=bounds, n_shots=n_shots,
+                      readout=getattr(readout, "name", None)))
+    return result
+
+
+def dispersive_shift(readout: Any,
+                     drive: Any,
+                     digitizer: Any,
+                     f_start: float,
+                     f_stop: float,
+                     n_points: int = 101,
+                     name: str = "dispersive_shift") -> Dict[str, Any]:
+    """
+    Dispersive shift from interleaved ground and excited resonator sweeps.
+
+    ``drive`` must be set up to play a π pulse before each readout. A single
+    sweep of ``readout`` over ``n_points`` between ``f_start`` and ``f_stop``
+    acquires, at each frequency, one point with the drive off and one with
+    the drive on, so both traces share the sweep setup and see the same slow
+    drifts. χ is fitted from both traces jointly with
+    :func:`analysis_lib.fit_dispersive_shift`.
+
+    Returns:
+        ``chi``, ``chi_err``, ``f_ground``, ``f_excited`` and ``fwhm``, in
+        the units of the frequencies.
+    """
+    freqs = np.linspace(f_start, f_stop, n_points)
+    traces = np.empty((2, n_points), dtype=complex)
+    readout.on()
+    try:
+        for i, f in enumerate(freqs):
+            readout.frequency(f)
+            drive.off()
+            traces[0, i] = digitizer.acquire()
+            drive.on()
+            traces[1, i] = digitizer.acquire()
+    finally:
+        drive.off()
+
+    result = fit_dispersive_shift(freqs, traces[0], traces[1])
+    result["dataset"] = save_dataset(
+        name, {"frequency": freqs, "ground": traces[0], "excited": traces[1]},
+        metadata=dict(result, readout=getattr(readout, "name", None),
+                      drive=getattr(drive, "name", None)))
+    return result
+
+
+def time_of_flight(readout: Any,
+                   digitizer: Any,
+                   n_traces: int = 20000,
+                   batch_size: int = 500,
+                   n_baseline: int = 64,
+                   threshold: float = 5.0,
+                   template: Optional[np.ndarray] = None,
+                   name: str = "time_of_flight") -> Dict[str, Any]:
+    """
+    Delay between the start of the acquisition and the readout pulse.
+
+    ``n_traces`` raw ADC traces are streamed from
+    ``digitizer.acquire_traces`` in batches of ``batch_size`` into one
+    preallocated buffer and summed in place, so memory and time do not depend
+    on per-trace allocations. The onset of the averaged trace is found with
+    :func:`analysis_lib.signal_onset`, by threshold on the envelope or, given
+    the ``template`` of the readout pulse, by cross-correlation with it.
+
+    Returns:
+        ``delay`` in seconds (NaN if no pulse was found) and its index
+        ``onset`` in the trace.
+    """
+    n_samples = digitizer.trace_length
+    buffer = np.empty((batch_size, n_samples), dtype=np.float32)
+    batch_sum = np.empty(n_samples, dtype=np.float64)
+    average = np.zeros(n_samples, dtype=np.float64)
+    readout.on()
+    n_done = 0
+    while n_done < n_traces:
+        batch = buffer[:min(batch_size, n_traces - n_done)]
+        digitizer.acquire_traces(batch)
+        np.sum(batch, axis=0, dtype=np.float64, out=batch_sum)
+        average += batch_sum
+        n_done += len(batch)
+    average /= n_traces
+
+    onset = signal_onset(average, n_baseline, threshold, template)
+    delay = onset / digitizer.sample_rate if onset >= 0 else np.nan
+    result = {"delay": float(delay), "onset": onset}
+    result["dataset"] = save_dataset(
+        name, {"time": np.arange(n_samples) / digitizer.sample_rate,
+               "average": average},
+        metadata=dict(result, n_traces=n_traces,
+                      method="threshold" if template is None else "template",
+                      readout=getattr(readout, "name", None),
+                      digitizer=getattr(digitizer, "name", None)))
+    return result
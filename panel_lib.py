@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Parameter panels generated from the driver metadata.
+
+:func:`parameter_metadata` reads the label, unit and validator of every
+parameter of a QCoDeS instrument (``RohdeSchwarzSGS100A`` in practice)
+without talking to it, and sorts the parameters by SCPI subsystem.
+:class:`ParameterPanel` shows one tab per subsystem with a virtual list:
+only the rows that fit in the window exist as widgets, they are re-bound to
+other parameters when the list scrolls, and only the visible parameters are
+read from the instrument. Opening a panel on hundreds of parameters is as
+fast as opening one on ten.
+"""
+
+import tkinter as tk
+from tkinter import messagebox, ttk
+from typing import Any, Dict, List, Optional
+
+SUBSYSTEMS = ("SOUR", "SWE", "PULM", "AM/FM/PM", "SENS", "Other")
+
+
+def subsystem(parameter: Any) -> str:
+    """SCPI subsystem of ``parameter``, from its set or get command."""
+    command = None
+    for attribute in ("set_raw", "get_raw"):
+        command = getattr(getattr(parameter, attribute, None), "cmd_str", None)
+        if isinstance(command, str):
+            break
+    if not isinstance(command, str):
+        return "Other"
+    nodes = [node.rstrip("?{}0123456789 ").upper()
+             for node in command.lstrip(":").split(" ")[0].split(":")]
+    if nodes[0].startswith("SENS"):
+        return "SENS"
+    if nodes[0].startswith("SOUR"):
+        nodes = nodes[1:] or ["SOUR"]
+    head = nodes[0]
+    if head.startswith("SWE"):
+        return "SWE"
+    if head.startswith("PULM"):
+        return "PULM"
+    if head in ("AM", "FM", "PM"):
+        return "AM/FM/PM"
+    if head in ("FREQ", "POW", "PHAS", "ROSC", "LOSC", "IQ", "SOUR", "OUTP"):
+        return "SOUR"
+    return "Other"
+
+
+def _choices(values: Any) -> Optional[List[str]]:
+    """Enum values as shown in a combobox: strings only, one per spelling."""
+    if not values:
+        return None
+    strings = [value for value in values if isinstance(value, str)] or \
+        list(map(str, values))
+    return sorted({value.lower(): value for value in sorted(strings)}.values())
+
+
+def _bound(value: Any) -> Optional[float]:
+    if value is None or abs(value) == float("inf"):
+        return None
+    return value
+
+
+def parameter_metadata(instrument: Any) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Description of the settable parameters of ``instrument``, by subsystem.
+
+    Each entry has the parameter ``name``, ``label``, ``unit``, ``choices``
+    (the enum values, or None) and ``minimum``/``maximum`` (None if
+    unbounded). Only the driver definitions are read, not the instrument.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {name: [] for name in SUBSYSTEMS}
+    for name, parameter in instrument.parameters.items():
+        if not getattr(parameter, "settable", True):
+            continue
+        validator = getattr(parameter, "vals", None)
+        choices = _choices(getattr(validator, "values", None))
+        groups[subsystem(parameter)].append({
+            "name": name,
+            "label": getattr(parameter, "label", name) or name,
+            "unit": getattr(parameter, "unit", "") or "",
+            "choices": choices,
+            "minimum": _bound(getattr(validator, "min_value", None)),
+            "maximum": _bound(getattr(validator, "max_value", None)),
+        })
+    return {name: entries for name, entries in groups.items() if entries}
+
+
+class _Row:
+    """Widgets of one visible line of a :class:`_VirtualList`."""
+
+    def __init__(self, master: tk.Widget, on_set: Any) -> None:
+        self.label = tk.Label(master, anchor="w", width=28)
+        self.value = tk.StringVar()
+        self.entry = ttk.Combobox(master, textvariable=self.value, width=18)
+        self.unit = tk.Label(master, anchor="w", width=22)
+        self.button = tk.Button(master, text="Set", command=lambda: on_set(self))
+        self.index: Optional[int] = None
+
+    def grid(self, row: int) -> None:
+        self.label.grid(row=row, column=0, sticky="w")
+        self.entry.grid(row=row, column=1)
+        self.unit.grid(row=row, column=2, sticky="w")
+        self.button.grid(row=row, column=3)
+
+    def grid_remove(self) -> None:
+        for widget in (self.label, self.entry, self.unit, self.button):
+            widget.grid_remove()
+
+    def show(self, index: int, entry: Dict[str, Any]) -> None:
+        self.index = index
+        self.label.config(text=entry["label"])
+        self.entry.config(values=entry["choices"] or [],
+                          state="readonly" if entry["choices"] else "normal")
+        bounds = ""
+        if entry["minimum"] is not None or entry["maximum"] is not None:
+            bounds = f" [{entry['minimum']}, {entry['maximum']}]"
+        self.unit.config(text=f"{entry['unit']}{bounds}")
+        self.value.set("")
+
+
+class _VirtualList(tk.Frame):
+    """Scrollable list of parameters backed by a fixed pool of rows."""
+
+    def __init__(self, master: tk.Widget, instrument: Any,
+                 entries: List[Dict[str, Any]], n_rows: int) -> None:
+        super().__init__(master)
+        self.instrument = instrument
+        self.entries = entries
+        self.first = 0
+        body = tk.Frame(self)
+        body.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ttk.Scrollbar(self, command=self.scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.rows = [_Row(body, self.set_value)
+                     for _ in range(min(n_rows, len(entries)))]
+        for i, row in enumerate(self.rows):
+            row.grid(i)
+        for widget in (self, body):
+            widget.bind("<MouseWheel>",
+                        lambda event: self.scroll("scroll", -event.delta // 120,
+                                                  "units"))
+        self.refresh()
+
+    def scroll(self, action: str, amount: Any, unit: str = "units") -> None:
+        last = max(len(self.entries) - len(self.rows), 0)
+        if action == "moveto":
+            first = int(round(float(amount) * len(self.entries)))
+        else:
+            step = len(self.rows) if unit == "pages" else 1
+            first = self.first + int(amount) * step
+        first = min(max(first, 0), last)
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def refresh(self) -> None:
+        """Bind the rows to the visible parameters and read their values."""
+        for offset, row in enumerate(self.rows):
+            row.show(self.first + offset, self.entries[self.first + offset])
+        n = max(len(self.entries), 1)
+        self.scrollbar.set(self.first / n, (self.first + len(self.rows)) / n)
+        self.poll()
+
+    def poll(self) -> None:
+        """Read the visible parameters (and only those) from the instrument."""
+        for row in self.rows:
+            parameter = self.instrument.parameters[self.entries[row.index]["name"]]
+            if not getattr(parameter, "gettable", True):
+                continue
+            try:
+                row.value.set(str(parameter.get()))
+            except Exception:
+                row.value.set("?")
+
+    def set_value(self, row: _Row) -> None:
+        entry = self.entries[row.index]
+        text = row.value.get()
+        try:
+            value = text if entry["choices"] else float(text)
+            self.instrument.parameters[entry["name"]].set(value)
+        except Exception as error:
+            messagebox.showerror(entry["label"], str(error))
+
+
+class ParameterPanel(ttk.Notebook):
+    """
+    One tab per SCPI subsystem of ``instrument``, each a virtual list of
+    ``n_rows`` visible parameters. The visible parameters of the current
+    tab are read again every ``poll_interval`` ms (never if None).
+    """
+
+    def __init__(self, master: tk.Widget, instrument: Any, n_rows: int = 12,
+                 poll_interval: Optional[int] = None) -> None:
+        super().__init__(master)
+        self.instrument = instrument
+        self.metadata = parameter_metadata(instrument)
+        self.poll_interval = poll_interval
+        self.lists: Dict[str, _VirtualList] = {}
+        self._frames: Dict[str, tk.Frame] = {}
+        for name, entries in self.metadata.items():
+            self._frames[name] = tk.Frame(self)
+            self.add(self._frames[name], text=f"{name} ({len(entries)})")
+        self.n_rows = n_rows
+        self.bind("<<NotebookTabChanged>>", self._show_tab)
+        if poll_interval:
+            self.after(poll_interval, self._poll)
+
+    def _current(self) -> str:
+        return self.tab(self.select(), "text").rsplit(" (", 1)[0]
+
+    def _show_tab(self, event: Any = None) -> None:
+        """Build the list of a tab the first time it is shown."""
+        name = self._current()
+        if name not in self.lists:
+            self.lists[name] = _VirtualList(self._frames[name], self.instrument,
+                                            self.metadata[name], self.n_rows)
+            self.lists[name].pack(fill="both", expand=True)
+
+    def _poll(self) -> None:
+        if self._current() in self.lists:
+            self.lists[self._current()].poll()
+        self.after(self.poll_interval, self._poll)
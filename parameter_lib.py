@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Calibration parameter database.
+
+Every calibrated quantity (π-pulse amplitude, readout frequency, T1...) is
+one row of an SQLite table with the qubit, the quantity, its value, the time
+it was measured and its provenance (routine and dataset). Rows are never
+overwritten: a new calibration adds a row and a bad one is marked invalid,
+so the table is also the history of every quantity.
+
+The ``(qubit, quantity, timestamp)`` index makes the latest valid value a
+single index lookup, and a history a range scan of the index, however large
+the database grows.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from dataset_lib import DATA_DIR
+
+DATABASE_FILE = "calibration.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parameters (
+    id INTEGER PRIMARY KEY,
+    qubit TEXT NOT NULL,
+    quantity TEXT NOT NULL,
+    value REAL NOT NULL,
+    timestamp REAL NOT NULL,
+    valid INTEGER NOT NULL DEFAULT 1,
+    routine TEXT,
+    dataset TEXT,
+    settings TEXT
+);
+CREATE INDEX IF NOT EXISTS parameters_lookup
+    ON parameters (qubit, quantity, timestamp);
+"""
+
+
+class ParameterStore:
+    """
+    SQLite store of calibrated parameters, safe to share between threads.
+
+    Args:
+        path: database file, by default ``calibration.db`` in
+            :data:`dataset_lib.DATA_DIR`; ``":memory:"`` for a throw-away
+            store.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        if path is None:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            path = os.path.join(DATA_DIR, DATABASE_FILE)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def record(self, qubit: str, quantity: str, value: float,
+               routine: Optional[str] = None, dataset: Optional[str] = None,
+               settings: Optional[Dict[str, Any]] = None,
+               timestamp: Optional[float] = None) -> int:
+        """Add a value of ``quantity`` for ``qubit`` and return its row id."""
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO parameters (qubit, quantity, value, timestamp, "
+                "routine, dataset, settings) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (qubit, quantity, float(value),
+                 time.time() if timestamp is None else timestamp, routine,
+                 dataset, json.dumps(settings, default=str) if settings else None))
+        return cursor.lastrowid
+
+    def record_result(self, qubit: str, routine: str, result: Dict[str, Any],
+                      quantities: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Record the finite scalar entries of a routine ``result`` (only
+        ``quantities`` if given), with its ``dataset`` as provenance. A
+        NaN, as routines return when they found nothing, is not recorded; a
+        declared quantity that is missing or not a scalar is not recorded
+        either, with a warning.
+
+        Returns:
+            The row id of each recorded quantity.
+        """
+        ids = {}
+        for quantity in quantities or result:
+            value = result.get(quantity)
+            if (not isinstance(value, (int, float, np.number))
+                    or isinstance(value, bool)):
+                if quantities:
+                    warnings.warn(f"{routine}: {quantity} is not a scalar "
+                                  f"({type(value).__name__}), not recorded",
+                                  stacklevel=2)
+            elif np.isfinite(value):
+                ids[quantity] = self.record(qubit, quantity, value, routine,
+                                            result.get("dataset"))
+        return ids
+
+    def invalidate(self, row_id: int) -> None:
+        """Mark a recorded value as invalid, it is then skipped by lookups."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE parameters SET valid = 0 WHERE id = ?", (row_id,))
+
+    def latest_entry(self, qubit: str, quantity: str,
+                     max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Latest valid row of ``quantity`` for ``qubit``, as a dict with its
+        provenance; None if there is none (or none younger than ``max_age``
+        seconds).
+        """
+        since = -np.inf if max_age is None else time.time() - max_age
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, value, timestamp, routine, dataset, settings "
+                "FROM parameters WHERE qubit = ? AND quantity = ? "
+                "AND timestamp >= ? AND valid = 1 "
+                "ORDER BY timestamp DESC LIMIT 1",
+                (qubit, quantity, since)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "value", "timestamp", "routine", "dataset", "settings")
+        entry = dict(zip(keys, row))
+        entry["settings"] = json.loads(entry["settings"] or "null")
+        return entry
+
+    def latest(self, qubit: str, quantity: str, default: Any = None,
+               max_age: Optional[float] = None) -> Any:
+        """Latest valid value of ``quantity`` for ``qubit``, ``default`` if none."""
+        entry = self.latest_entry(qubit, quantity, max_age)
+        return default if entry is None else entry["value"]
+
+    def history(self, qubit: str, quantity: str, since: Optional[float] = None,
+                include_invalid: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """``(timestamps, values)`` of ``quantity`` for ``qubit``, oldest first."""
+        query = ("SELECT timestamp, value FROM parameters "
+                 "WHERE qubit = ? AND quantity = ? AND timestamp >= ?")
+        if not include_invalid:
+            query += " AND valid = 1"
+        with self._lock:
+            rows = self._connection.execute(
+                query + " ORDER BY timestamp",
+                (qubit, quantity, -np.inf if since is None else since)).fetchall()
+        data = np.array(rows, dtype=float).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Pulse-sequence compiler for the single-qubit gate calibrations.
+
+Sequences are lists of pulse names (``"X180"``, ``"mY90"``...). The
+:class:`PulseCompiler` turns every name into a Gaussian DRAG waveform for the
+current pulse parameters, uploads each distinct waveform to the AWG only once
+and then programs sequences as lists of references to uploaded waveforms.
+Identical segments are shared between sequences (the 21 AllXY pairs use 5
+waveforms, the flipping sequences 3), so compile and upload time scale with
+the number of unique pulses rather than with the number of sequences.
+
+The compiler implements the ``sequencer`` interface of :mod:`measurement_lib`
+(``load(pulses)``) on top of any :class:`AWG`.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class AWG:
+    """
+    Interface of the arbitrary waveform generators driven by the compiler.
+
+    Waveforms are complex sample arrays (I + jQ) stored under a name; a
+    sequence is the list of waveform names played back to back.
+    """
+
+    def upload_waveform(self, name: str, samples: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def set_sequence(self, names: Sequence[str]) -> None:
+        raise NotImplementedError
+
+
+# rotation angle (in units of the pi pulse) and axis phase of each pulse
+PULSE_DEFINITIONS: Dict[str, Tuple[float, float]] = {
+    "I": (0.0, 0.0),
+    "X180": (1.0, 0.0),
+    "Y180": (1.0, 90.0),
+    "X90": (0.5, 0.0),
+    "Y90": (0.5, 90.0),
+    "mX90": (-0.5, 0.0),
+    "mY90": (-0.5, 90.0),
+}
+
+
+def drag_waveform(amplitude: float, phase: float, duration: float,
+                  sigma: float, drag: float, sample_rate: float) -> np.ndarray:
+    """
+    Gaussian pulse with a DRAG quadrature, truncated to ``duration``.
+
+    ``drag`` scales the derivative of the Gaussian (in seconds) added in
+    quadrature; ``phase`` (degrees) rotates the pulse axis.
+    """
+    t = np.arange(int(round(duration * sample_rate))) / sample_rate - duration / 2
+    gaussian = amplitude * np.exp(-t ** 2 / (2 * sigma ** 2))
+    derivative = -t / sigma ** 2 * gaussian
+    return (gaussian - 1j * drag * derivative) * np.exp(1j * np.deg2rad(phase))
+
+
+class PulseCompiler:
+    """
+    Compile pulse-name sequences to deduplicated AWG waveforms.
+
+    Args:
+        awg: the :class:`AWG` receiving waveforms and sequences.
+        pi_amplitude: AWG amplitude of the π pulse.
+        duration: length of every pulse, in seconds.
+        sigma: Gaussian width, by default a quarter of ``duration``.
+        drag: DRAG coefficient, in seconds.
+        sample_rate: AWG sample rate, in samples per second.
+    """
+
+    def __init__(self, awg: Any, pi_amplitude: float = 1.0,
+                 duration: float = 40e-9, sigma: Optional[float] = None,
+                 drag: float = 0.0, sample_rate: float = 1e9) -> None:
+        self.awg = awg
+        self.parameters = {"pi_amplitude": pi_amplitude, "duration": duration,
+                           "sigma": sigma or duration / 4, "drag": drag,
+                           "sample_rate": sample_rate}
+        self.uploaded: Dict[Tuple[float, ...], str] = {}
+        self.n_uploads = 0
+
+    def set_pulse_parameters(self, **parameters: float) -> None:
+        """
+        Update ``pi_amplitude``, ``duration``, ``sigma``, ``drag`` or
+        ``sample_rate``. Waveforms already uploaded for other parameter values
+        stay available and are reused if those values come back.
+        """
+        unknown = set(parameters) - set(self.parameters)
+        if unknown:
+            raise KeyError(f"Unknown pulse parameters {sorted(unknown)}")
+        self.parameters.update(parameters)
+
+    def _key(self, pulse: str) -> Tuple[float, ...]:
+        try:
+            angle, phase = PULSE_DEFINITIONS[pulse]
+        except KeyError:
+            raise KeyError(f"Unknown pulse {pulse!r}, "
+                           f"use one of {list(PULSE_DEFINITIONS)}") from None
+        p = self.parameters
+        amplitude = angle * p["pi_amplitude"]
+        if amplitude < 0:
+            amplitude, phase = -amplitude, phase + 180
+        return (round(amplitude, 12), phase % 360, p["duration"], p["sigma"],
+                p["drag"] if amplitude else 0.0, p["sample_rate"])
+
+    def compile(self, pulses: Sequence[str]) -> List[str]:
+        """
+        Upload the waveforms of ``pulses`` that are not on the AWG yet and
+        return the waveform names of the sequence.
+        """
+        names = []
+        for pulse in pulses:
+            key = self._key(pulse)
+            name = self.uploaded.get(key)
+            if name is None:
+                name = f"wf{len(self.uploaded)}"
+                amplitude, phase, duration, sigma, drag, sample_rate = key
+                self.awg.upload_waveform(name, drag_waveform(
+                    amplitude, phase, duration, sigma, drag, sample_rate))
+                self.uploaded[key] = name
+                self.n_uploads += 1
+            names.append(name)
+        return names
+
+    def load(self, pulses: Sequence[str]) -> None:
+        """Compile ``pulses`` and program them as the AWG sequence."""
+        self.awg.set_sequence(self.compile(pulses))
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated SGS100A for running the instrument server without hardware.
+
+:class:`SimulatedSGS100A` has the frequency, phase, power and output
+parameters of :class:`RS_lib.RohdeSchwarzSGS100A`, with the same SCPI
+commands, on the pyvisa-sim backend described in ``SGS100A_sim.yaml``.
+Messages of several ``;``-separated commands, as sent by
+:class:`station_lib.StationState`, are split before they reach the backend,
+which only knows single commands.
+:func:`check_server` serves it on localhost and checks get, set and
+subscriptions through :class:`instrument_server_lib.InstrumentClient`::
+
+    python sim_lib.py            # exit status 1 if the check fails
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+import qcodes.validators as vals
+from qcodes.instrument import VisaInstrument
+from qcodes.parameters import create_on_off_val_mapping
+
+from event_lib import EventBus, observe
+
+SIM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "SGS100A_sim.yaml")
+SIM_ADDRESS = "GPIB::1::INSTR"
+
+
+class SimulatedSGS100A(VisaInstrument):
+    """The core parameters of the SGS100A driver, on the simulated backend."""
+
+    def __init__(self, name: str, address: str = SIM_ADDRESS,
+                 **kwargs: Any) -> None:
+        kwargs.setdefault("pyvisa_sim_file", SIM_FILE)
+        super().__init__(name, address, terminator='\n', **kwargs)
+        self.add_parameter('frequency', label='Frequency', unit='Hz',
+                           get_cmd='SOUR:FREQ?', set_cmd='SOUR:FREQ {:.2f}',
+                           get_parser=float, vals=vals.Numbers(1e6, 20e9))
+        self.add_parameter('phase', label='Phase', unit='deg',
+                           get_cmd='SOUR:PHAS?', set_cmd='SOUR:PHAS {:.2f}',
+                           get_parser=float, vals=vals.Numbers(0, 360))
+        self.add_parameter('power', label='Power', unit='dBm',
+                           get_cmd='SOUR:POW?', set_cmd='SOUR:POW {:.2f}',
+                           get_parser=float, vals=vals.Numbers(-120, 25))
+        self.add_parameter('status', label='RF Output',
+                           get_cmd=':OUTP:STAT?', set_cmd=':OUTP:STAT {}',
+                           val_mapping=create_on_off_val_mapping(on_val='1',
+                                                                 off_val='0'))
+        self.events = observe(self, EventBus())
+        self.connect_message()
+
+    @staticmethod
+    def _split(message: str) -> List[str]:
+        """The commands of ``message``, without the leading ``:`` of the headers."""
+        return [command.strip().lstrip(":") for command in message.split(";")
+                if command.strip()]
+
+    def write_raw(self, cmd: str) -> None:
+        for command in self._split(cmd):
+            super().write_raw(command)
+
+    def ask_raw(self, cmd: str) -> str:
+        *commands, query = self._split(cmd)
+        for command in commands:
+            super().write_raw(command)
+        return super().ask_raw(query)
+
+    def on(self) -> None:
+        self.status('on')
+
+    def off(self) -> None:
+        self.status('off')
+
+
+def check_server(n_requests: int = 200) -> Dict[str, float]:
+    """
+    Serve a :class:`SimulatedSGS100A` on a free localhost port and check a
+    set, a get and a subscription through a client.
+
+    Returns:
+        The mean round trip of a get, ``round_trip`` in seconds.
+
+    Raises:
+        AssertionError: if a value or an event is wrong or missing.
+    """
+    from instrument_server_lib import InstrumentClient, InstrumentServer
+    source = SimulatedSGS100A("sim_source")
+    server = InstrumentServer({"drive": source}, port=0).start()
+    client = InstrumentClient(*server.address)
+    try:
+        drive = client.instrument("drive")
+        events = []
+        received = threading.Event()
+
+        def on_event(value: Any) -> None:
+            events.append(value)
+            received.set()
+
+        client.subscribe("drive", "frequency", on_event)
+        drive.frequency(5.125e9)
+        assert drive.frequency() == 5.125e9, drive.frequency()
+        drive.power(-12.5)
+        assert drive.power() == -12.5, drive.power()
+        drive.on()
+        assert drive.status() is True, drive.status()
+        assert received.wait(5.0), "no frequency event"
+        assert events[-1] == 5.125e9, events
+
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            drive.frequency()
+        return {"round_trip": (time.perf_counter() - start) / n_requests}
+    finally:
+        client.close()
+        server.shutdown()
+        source.close()
+
+
+if __name__ == "__main__":
+    try:
+        timing = check_server()
+    except AssertionError as error:
+        print(f"instrument server check failed: {error}")
+        sys.exit(1)
+    print(f"instrument server ok, {timing['round_trip'] * 1e6:.0f} us per get")
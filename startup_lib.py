@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Start-up time check of the ColdLab GUI.
+
+The GUI only imports Tk when it starts; the drivers and the analysis stack
+(NumPy, SciPy, QCoDeS...) are imported by the menu items that need them.
+:func:`check_startup` guards this with ``python -X importtime``, in a fresh
+interpreter so nothing is already cached::
+
+    python startup_lib.py            # exit status 1 on a regression
+"""
+
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+#: modules that must not be imported before the first measurement
+HEAVY_MODULES = ("numpy", "scipy", "pandas", "matplotlib", "qcodes", "pyvisa")
+
+#: budgets in seconds, for the imports and for the window to be drawn
+IMPORT_BUDGET = 0.15
+WINDOW_BUDGET = 0.3
+
+
+def import_times(module: str = "first_GUI") -> Dict[str, float]:
+    """
+    Cumulative import time in seconds of every module imported by
+    ``import module``, in a new interpreter.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) * 1e-6
+    return times
+
+
+def window_time() -> Optional[float]:
+    """
+    Seconds from interpreter start to the first drawn ColdLab window, None
+    without a display.
+
+    Raises:
+        RuntimeError: if the window cannot be created, with its traceback.
+    """
+    if sys.platform != "win32" and not os.environ.get("DISPLAY"):
+        return None
+    script = ("import tkinter as tk, first_GUI; root = tk.Tk(); "
+              "first_GUI.root = root; first_GUI.ColdLab(root); root.update(); "
+              "root.destroy()")
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", script],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1]
+                           if process.stderr.strip() else
+                           f"exit status {process.returncode}")
+    return time.perf_counter() - start
+
+
+def check_startup(module: str = "first_GUI") -> List[str]:
+    """The start-up regressions of ``module``, empty if there are none."""
+    times = import_times(module)
+    problems = [f"{name} is imported at start-up"
+                for name in HEAVY_MODULES if name in times]
+    if times[module] > IMPORT_BUDGET:
+        problems.append(f"importing {module} takes {times[module]:.3f} s "
+                        f"(budget {IMPORT_BUDGET} s)")
+    if module == "first_GUI":
+        try:
+            elapsed = window_time()
+        except RuntimeError as error:
+            return problems + [f"the window cannot be created: {error}"]
+        if elapsed is not None and elapsed > WINDOW_BUDGET:
+            problems.append(f"the window takes {elapsed:.3f} s to appear "
+                            f"(budget {WINDOW_BUDGET} s)")
+    return problems
+
+
+if __name__ == "__main__":
+    problems = check_startup(*sys.argv[1:])
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Desired-state configuration of the station instruments.
+
+A measurement declares the complete state it needs, e.g.::
+
+    state.apply({"readout": {"frequency": 7.1e9, "power": -30, "status": "on"},
+                 "drive": {"frequency": 5.2e9, "power": -10, "status": "on"}})
+
+:class:`StationState` compares it with the last state it applied to each
+instrument and only sends the parameters that differ. The changes of one
+instrument go out as a single SCPI message terminated by ``*OPC?``, so the
+whole reconfiguration of a source costs one round trip, and none at all when
+back-to-back measurements share their settings.
+"""
+
+from typing import Any, Dict, Optional
+
+from qcodes.parameters.command import Command
+
+
+class StationState:
+    """
+    Last applied settings of the station instruments, and how to reach a new
+    desired state from them.
+
+    Args:
+        instruments: QCoDeS instruments (e.g. ``RohdeSchwarzSGS100A``) by
+            station name.
+    """
+
+    def __init__(self, instruments: Dict[str, Any]) -> None:
+        self.instruments = instruments
+        # SCPI command last sent for each parameter of each instrument (the
+        # repr of the value for parameters set through a Python function)
+        self.applied: Dict[str, Dict[str, str]] = {name: {} for name in instruments}
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """
+        Forget what was applied to instrument ``name`` (all instruments by
+        default), e.g. after a reset or a change from the front panel; the
+        next :meth:`apply` then sends every parameter again.
+        """
+        for key in [name] if name else self.instruments:
+            self.applied[key] = {}
+
+    def _command(self, parameter: Any, value: Any) -> Optional[str]:
+        """SCPI command setting ``parameter`` to ``value``, None if it has none."""
+        if not isinstance(parameter.set_raw, Command) or \
+                not isinstance(getattr(parameter.set_raw, "cmd_str", None), str):
+            return None
+        parameter.validate(value)
+        return parameter.set_raw.cmd_str.format(
+            parameter._from_value_to_raw_value(value))
+
+    def diff(self, name: str, desired: Dict[str, Any]) -> Dict[str, Any]:
+        """Parameters of ``desired`` that differ from the applied state of ``name``."""
+        instrument = self.instruments[name]
+        applied = self.applied[name]
+        changes = {}
+        for key, value in desired.items():
+            command = self._command(instrument.parameters[key], value)
+            if applied.get(key) != (command or repr(value)):
+                changes[key] = value
+        return changes
+
+    def apply(self, state: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Bring the instruments to ``state`` (settings by instrument name).
+
+        The changed parameters of each instrument are written in one message,
+        with absolute SCPI headers joined by ``;`` and followed by ``*OPC?``.
+        Parameters without a SCPI set command are set one by one. If the
+        transaction fails, or ``*OPC?`` does not answer ``1``, the applied
+        state of the instrument is forgotten, so nothing is skipped on the
+        next call.
+
+        Returns:
+            The parameters actually sent, by instrument name.
+
+        Raises:
+            RuntimeError: if an instrument does not acknowledge its message.
+        """
+        sent = {}
+        for name, desired in state.items():
+            changes = self.diff(name, desired)
+            if not changes:
+                continue
+            instrument = self.instruments[name]
+            commands = {}
+            try:
+                for key, value in changes.items():
+                    command = self._command(instrument.parameters[key], value)
+                    if command is None:
+                        instrument.parameters[key].set(value)
+                        self.applied[name][key] = repr(value)
+                    else:
+                        commands[key] = command
+                if commands:
+                    message = ";".join(":" + command.lstrip(":")
+                                       for command in commands.values()) + ";*OPC?"
+                    reply = instrument.ask(message)
+                    if reply.strip() != "1":
+                        raise RuntimeError(f"{name} answered {reply!r} "
+                                           f"instead of 1 to {message!r}")
+            except Exception:
+                self.invalidate(name)
+                raise
+            for key, command in commands.items():
+                instrument.parameters[key].cache.set(changes[key])
+                self.applied[name][key] = command
+            sent[name] = changes
+        return sent
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Nested sweeps described once, run at hardware speed where possible.
+
+A :class:`Sweep` is a list of axes, outermost first, each a settable
+parameter and its values::
+
+    sweep = Sweep((flux, np.linspace(-0.5, 0.5, 21)),
+                  (drive.power, np.arange(-30, 1, 5)),
+                  (drive.frequency, np.linspace(4.5e9, 5.5e9, 401)))
+    result = sweep.run(digitizer, name="qubit_flux_power")
+
+is the ``flux x power x frequency`` loop, acquiring one IQ point per
+frequency. When the innermost axis is the ``frequency`` or ``power`` of a
+driver with a native sweep (:meth:`RS_lib.RohdeSchwarzSGS100A.start_sweep`)
+and the digitizer implements :meth:`digitizer_lib.Digitizer.acquire_sweep`,
+each row is played by the source in sweep or list mode, stepped by the
+digitizer triggers; otherwise the innermost axis is stepped from Python.
+
+The outer axes are set through a :class:`station_lib.StationState` at the
+start of each row: only the parameters that changed are sent, and those of
+one instrument go out in a single SCPI message.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from dataset_lib import save_dataset
+from digitizer_lib import Digitizer
+from measurement_lib import parameter_sweep
+from station_lib import StationState
+
+_NATIVE = ("frequency", "power")
+
+
+def _acquires_sweeps(digitizer: Any) -> bool:
+    """Whether ``digitizer`` implements :meth:`Digitizer.acquire_sweep`."""
+    method = getattr(type(digitizer), "acquire_sweep", None)
+    return method is not None and method is not Digitizer.acquire_sweep
+
+
+def _carried(source: Any, parameter: str, values: np.ndarray) -> Optional[str]:
+    """
+    The parameter of ``source`` loaded with its sweep of ``parameter``
+    (:meth:`RS_lib.RohdeSchwarzSGS100A.sweep_carries`), the other native one
+    for drivers that do not tell.
+    """
+    if hasattr(source, "sweep_carries"):
+        return source.sweep_carries(parameter, values)
+    return next(name for name in _NATIVE if name != parameter)
+
+
+class Axis:
+    """
+    One swept dimension: ``parameter`` (called as ``parameter(value)``)
+    through ``values``, labelled ``name`` in the dataset (the parameter
+    name by default).
+    """
+
+    def __init__(self, parameter: Any, values: Sequence[float],
+                 name: Optional[str] = None) -> None:
+        self.parameter = parameter
+        self.values = np.asarray(values, dtype=float)
+        self.name = name or getattr(parameter, "name", None) or "axis"
+
+    @property
+    def instrument(self) -> Any:
+        """The QCoDeS instrument owning the parameter, None if there is none."""
+        instrument = getattr(self.parameter, "instrument", None)
+        if instrument is None or \
+                instrument.parameters.get(self.parameter.name) is not self.parameter:
+            return None
+        return instrument
+
+    @property
+    def native(self) -> bool:
+        """Whether the instrument can sweep this axis by itself."""
+        return (self.instrument is not None
+                and self.parameter.name in _NATIVE
+                and hasattr(self.instrument, "start_sweep"))
+
+
+class Sweep:
+    """
+    Nested axes, outermost first, given as :class:`Axis` or
+    ``(parameter, values)`` tuples.
+    """
+
+    def __init__(self, *axes: Union[Axis, Tuple[Any, Sequence[float]]]) -> None:
+        if not axes:
+            raise ValueError("a sweep needs at least one axis")
+        self.axes = [axis if isinstance(axis, Axis) else Axis(*axis)
+                     for axis in axes]
+        names = [axis.name for axis in self.axes]
+        if len(set(names)) != len(names):
+            raise ValueError(f"axis names must be unique, got {names}")
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(len(axis.values) for axis in self.axes)
+
+    def _outer_state(self) -> Tuple[StationState, List[Axis]]:
+        """State of the outer instruments, and the outer axes without one."""
+        instruments, unbound = {}, []
+        for axis in self.axes[:-1]:
+            if axis.instrument is None:
+                unbound.append(axis)
+            else:
+                instruments[axis.instrument.name] = axis.instrument
+        return StationState(instruments), unbound
+
+    def run(self, digitizer: Any, name: str = "sweep",
+            metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Acquire one IQ point per point of the sweep.
+
+        Returns:
+            The complex ``data`` of shape :attr:`shape`, the ``mode`` of the
+            innermost axis (``"hardware"`` or ``"software"``) and the
+            ``dataset``.
+        """
+        inner = self.axes[-1]
+        source = inner.instrument if inner.native else None
+        hardware = source is not None and _acquires_sweeps(digitizer)
+        if hardware:
+            carried = _carried(source, inner.parameter.name, inner.values)
+        state, unbound = self._outer_state()
+        data = np.empty(self.shape, dtype=complex)
+        last: Dict[str, float] = {}
+        armed = False
+        try:
+            for index in np.ndindex(self.shape[:-1]):
+                desired: Dict[str, Dict[str, Any]] = {}
+                for axis, i in zip(self.axes, index):
+                    value = float(axis.values[i])
+                    if axis in unbound:
+                        if last.get(axis.name) != value:
+                            axis.parameter(value)
+                            last[axis.name] = value
+                    else:
+                        desired.setdefault(axis.instrument.name, {})[
+                            axis.parameter.name] = value
+                sent = state.apply(desired)
+                if hardware:
+                    try:
+                        # a list sweep carries the level (or frequency) set
+                        # by the outer axes, reload it when they changed
+                        if not armed or carried in sent.get(source.name, {}):
+                            source.start_sweep(inner.parameter.name, inner.values)
+                            armed = True
+                        else:
+                            source.restart_sweep()
+                        data[index] = digitizer.acquire_sweep(len(inner.values))
+                        continue
+                    except NotImplementedError:
+                        source.stop_sweep()
+                        hardware = armed = False
+                data[index] = parameter_sweep(inner.parameter, digitizer,
+                                              inner.values)
+        finally:
+            if armed:
+                source.stop_sweep()
+
+        mode = "hardware" if hardware else "software"
+        arrays: Dict[str, Any] = {axis.name: axis.values for axis in self.axes}
+        arrays["data"] = data
+        result = {"data": data, "mode": mode}
+        result["dataset"] = save_dataset(
+            name, arrays,
+            metadata=dict(metadata or {}, mode=mode,
+                          axes=[axis.name for axis in self.axes],
+                          digitizer=getattr(digitizer, "name", None)))
+        return result
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Tests of the analysis functions on synthetic data."""
+
+import numpy as np
+import pytest
+
+from analysis_lib import signal_onset
+
+SAMPLE_RATE = 1e9
+CARRIER = 50e6
+ONSET = 300
+
+
+def readout_trace(noise: float, seed: int = 0, n_samples: int = 2000,
+                  phase: float = 0.0, length: int = 1000) -> np.ndarray:
+    """A 50 MHz readout pulse of ``length`` samples from ``ONSET``, with noise."""
+    rng = np.random.default_rng(seed)
+    index = np.arange(n_samples)
+    t = index / SAMPLE_RATE
+    pulse = np.where((index >= ONSET) & (index < ONSET + length),
+                     np.cos(2 * np.pi * CARRIER * t + phase), 0.0)
+    return 0.1 + pulse + rng.normal(0, noise, n_samples)
+
+
+@pytest.mark.parametrize("noise", [0.01, 0.05, 0.1])
+@pytest.mark.parametrize("seed", range(5))
+def test_threshold_onset(noise, seed):
+    onset = signal_onset(readout_trace(noise, seed))
+    assert ONSET <= onset <= ONSET + 4
+
+
+@pytest.mark.parametrize("noise", [0.01, 0.1, 0.5])
+@pytest.mark.parametrize("phase", [0.0, 1.0, np.pi])
+def test_template_onset(noise, phase):
+    t = np.arange(1000) / SAMPLE_RATE
+    template = np.cos(2 * np.pi * CARRIER * t)
+    onset = signal_onset(readout_trace(noise, phase=phase), template=template)
+    assert abs(onset - ONSET) <= 2
+
+
+def test_no_pulse():
+    trace = np.random.default_rng(1).normal(0, 0.1, 2000)
+    assert signal_onset(trace) == -1
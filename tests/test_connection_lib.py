@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Tests of the instrument connection pool on the simulated source."""
+
+import pytest
+from pyvisa import constants, errors
+
+import connection_lib
+from sim_lib import SIM_ADDRESS, SimulatedSGS100A
+
+
+@pytest.fixture
+def source():
+    instrument = connection_lib.open_instrument(SimulatedSGS100A, "pool_source",
+                                                SIM_ADDRESS)
+    yield instrument
+    connection_lib.close_instrument(SIM_ADDRESS)
+
+
+def test_pool_returns_the_open_instrument(source):
+    assert connection_lib.open_instrument(SimulatedSGS100A, "pool_source",
+                                          SIM_ADDRESS) is source
+
+
+def test_pool_rejects_another_name(source):
+    with pytest.raises(ValueError, match="already open"):
+        connection_lib.open_instrument(SimulatedSGS100A, "other", SIM_ADDRESS)
+
+
+@pytest.mark.parametrize("cmd, retried", [("SOUR:FREQ?", True),
+                                          ("SOUR:FREQ 5e9", False),
+                                          (":SOUR:FREQ 5e9;*OPC?", False)])
+def test_only_queries_are_retried(monkeypatch, cmd, retried):
+    calls = []
+
+    def method(cmd):
+        calls.append(cmd)
+        if len(calls) == 1:
+            raise errors.VisaIOError(constants.StatusCode.error_timeout)
+        return "1"
+
+    monkeypatch.setattr(connection_lib, "reconnect", lambda *args: None)
+    call = connection_lib._with_retry(None, SIM_ADDRESS, method)
+    if retried:
+        assert call(cmd) == "1"
+    else:
+        with pytest.raises(errors.VisaIOError):
+            call(cmd)
+    assert len(calls) == (2 if retried else 1)
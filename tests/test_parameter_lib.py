@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Tests of the calibrated parameter store."""
+
+import numpy as np
+import pytest
+
+from parameter_lib import ParameterStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ParameterStore(str(tmp_path / "parameters.sqlite"))
+    yield store
+    store.close()
+
+
+def test_record_result_skips_nan(store):
+    result = {"readout_frequency": 7.1e9, "readout_power": np.nan,
+              "dataset": "punchout.h5"}
+    ids = store.record_result("QB_1", "resonator_punchout", result,
+                              ("readout_frequency", "readout_power"))
+    assert list(ids) == ["readout_frequency"]
+    assert store.latest_entry("QB_1", "readout_frequency")["value"] == 7.1e9
+
+
+def test_record_result_warns_on_declared_arrays(store):
+    result = {"f0": np.array([7.1e9, 7.2e9]), "n_points": 40}
+    with pytest.warns(UserWarning, match="f0 is not a scalar"):
+        ids = store.record_result("QB_1", "resonator_punchout", result, ("f0",))
+    assert ids == {}
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""Start-up time check of the GUI, see :mod:`startup_lib`."""
+
+import os
+import sys
+
+import pytest
+
+from startup_lib import check_startup
+
+
+@pytest.mark.skipif(sys.platform != "win32" and not os.environ.get("DISPLAY"),
+                    reason="needs a display to draw the window")
+def test_startup():
+    assert check_startup() == []
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Tests of the desired-state configuration on the simulated source."""
+
+import pytest
+
+from sim_lib import SimulatedSGS100A
+from station_lib import StationState
+
+
+@pytest.fixture
+def source():
+    instrument = SimulatedSGS100A("state_source")
+    yield instrument
+    instrument.close()
+
+
+def test_apply_sends_one_message(source):
+    state = StationState({"source": source})
+    sent = state.apply({"source": {"frequency": 5.2e9, "power": -10.0}})
+    assert sent == {"source": {"frequency": 5.2e9, "power": -10.0}}
+    assert source.frequency.get() == 5.2e9
+    assert source.power.get() == -10.0
+    assert state.apply({"source": {"frequency": 5.2e9, "power": -10.0}}) == {}
+
+
+def test_apply_checks_the_acknowledgement(source, monkeypatch):
+    state = StationState({"source": source})
+    state.apply({"source": {"frequency": 5.2e9}})
+    monkeypatch.setattr(source, "ask", lambda message: "0")
+    with pytest.raises(RuntimeError, match="instead of 1"):
+        state.apply({"source": {"frequency": 6e9}})
+    assert state.applied["source"] == {}
+    assert source.frequency.cache.get(get_if_invalid=False) == 5.2e9